@@ -1,11 +1,13 @@
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 from typing import Any, Optional
 
 app = FastAPI(title="AI Service", version="0.1")
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 class AnalyzeReq(BaseModel):
@@ -14,7 +16,7 @@ class AnalyzeReq(BaseModel):
     hint: dict[str, Any] | None = None
 
 @app.post("/v1/analyze")
-def analyze(req: AnalyzeReq):
+async def analyze(req: AnalyzeReq):
     # Заглушка: возвращаем “скелет” результата
     # Позже сюда подключим модель/пайплайн и нормализацию категорий
     return {
@@ -28,4 +30,4 @@ def analyze(req: AnalyzeReq):
         "confidence": {"category": 0.1, "type": 0.1},
         "title_suggested": "Товар (черновик)",
         "description_draft": None,
-    }
\ No newline at end of file
+    }
@@ -14,7 +14,8 @@ if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
 # ---- IMPORTANT: always take DB url from env ----
-db_url = os.getenv("DATABASE_URL")
+# DATABASE_URL_DIRECT — мимо PgBouncer (DDL / CONCURRENTLY / session-level locks)
+db_url = os.getenv("DATABASE_URL_DIRECT") or os.getenv("DATABASE_URL")
 
 if not db_url:
     raise RuntimeError(
@@ -0,0 +1,44 @@
+"""users_drop_redundant_email_index
+
+Revision ID: 8d1c4e7a2b90
+Revises: 2466277e6062
+Create Date: 2026-10-15
+
+Login/register ищут по users.email. Уникальный btree-индекс уже есть —
+его создаёт constraint uq_users_email (init schema), поиск идёт по нему.
+Неуникальный ix_users_email дублирует его и только замедляет запись — удаляем.
+CONCURRENTLY: без блокировки таблицы на время деплоя.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+revision: str = "8d1c4e7a2b90"
+down_revision: Union[str, None] = "2466277e6062"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_users_email",
+            table_name="users",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_users_email",
+            "users",
+            ["email"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
@@ -0,0 +1,71 @@
+"""looks_timestamps_not_null
+
+Revision ID: a4c7e2f9b6d1
+Revises: e7a2c4f9d1b5
+Create Date: 2026-10-15
+
+Keyset list_looks идёт по (updated_at, id) DESC: NULL в updated_at при DESC
+встаёт первым, tuple-сравнение с курсором такие строки пропускает, а курсор
+из NULL не собрать. Поэтому created_at / updated_at у looks — NOT NULL.
+
+1. DEFAULT timezone('utc', now()) — новые строки без явного времени не NULL.
+2. Backfill порциями (migration_utils.batched_execute): пропуски берём
+   из соседней колонки, иначе текущее время.
+3. CHECK (… IS NOT NULL) NOT VALID + VALIDATE в autocommit_block — проверка
+   без блокировки записи; с валидным CHECK SET NOT NULL (PG12+) не сканирует
+   таблицу под ACCESS EXCLUSIVE. CHECK после этого не нужен.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+from migration_utils import batched_execute
+
+
+revision: str = "a4c7e2f9b6d1"
+down_revision: Union[str, None] = "e7a2c4f9d1b5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_NOW_UTC = "timezone('utc', now())"
+_COLUMNS = ("created_at", "updated_at")
+
+
+def upgrade() -> None:
+    for column in _COLUMNS:
+        op.execute(f"ALTER TABLE looks ALTER COLUMN {column} SET DEFAULT {_NOW_UTC}")
+
+    batched_execute(
+        f"""
+        UPDATE looks
+        SET created_at = coalesce(created_at, updated_at, {_NOW_UTC}),
+            updated_at = coalesce(updated_at, created_at, {_NOW_UTC})
+        WHERE id IN (
+            SELECT id FROM looks
+            WHERE created_at IS NULL OR updated_at IS NULL
+            LIMIT :batch
+        )
+        """
+    )
+
+    for column in _COLUMNS:
+        op.execute(
+            f"ALTER TABLE looks ADD CONSTRAINT ck_looks_{column}_not_null "
+            f"CHECK ({column} IS NOT NULL) NOT VALID"
+        )
+    with op.get_context().autocommit_block():
+        for column in _COLUMNS:
+            op.execute(f"ALTER TABLE looks VALIDATE CONSTRAINT ck_looks_{column}_not_null")
+
+    for column in _COLUMNS:
+        op.execute(f"ALTER TABLE looks ALTER COLUMN {column} SET NOT NULL")
+        op.execute(f"ALTER TABLE looks DROP CONSTRAINT ck_looks_{column}_not_null")
+
+
+def downgrade() -> None:
+    for column in reversed(_COLUMNS):
+        op.execute(f"ALTER TABLE looks ALTER COLUMN {column} DROP NOT NULL")
+        op.execute(f"ALTER TABLE looks ALTER COLUMN {column} DROP DEFAULT")
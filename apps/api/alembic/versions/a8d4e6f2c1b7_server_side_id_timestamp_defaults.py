@@ -0,0 +1,46 @@
+"""server_side_id_timestamp_defaults
+
+Revision ID: a8d4e6f2c1b7
+Revises: f1c6a9d3e7b2
+Create Date: 2026-10-15
+
+id / created_at / updated_at для categories, media, ai_jobs генерирует
+Postgres прямо в INSERT (id возвращается через RETURNING) — API больше не
+собирает uuid4-строку и datetime на каждую вставку.
+gen_random_uuid() встроена в ядро с PG13 — pgcrypto не нужен.
+Только SET DEFAULT: метаданные, без переписывания таблиц.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+revision: str = "a8d4e6f2c1b7"
+down_revision: Union[str, None] = "f1c6a9d3e7b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_NEW_ID = "gen_random_uuid()::text"
+_NOW_UTC = "timezone('utc', now())"
+
+_DEFAULTS = [
+    ("categories", "id", _NEW_ID),
+    ("media", "id", _NEW_ID),
+    ("media", "created_at", _NOW_UTC),
+    ("ai_jobs", "id", _NEW_ID),
+    ("ai_jobs", "created_at", _NOW_UTC),
+    ("ai_jobs", "updated_at", _NOW_UTC),
+]
+
+
+def upgrade() -> None:
+    for table, column, default in _DEFAULTS:
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET DEFAULT {default}")
+
+
+def downgrade() -> None:
+    for table, column, _ in reversed(_DEFAULTS):
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} DROP DEFAULT")
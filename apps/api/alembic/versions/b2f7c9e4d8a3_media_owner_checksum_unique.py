@@ -0,0 +1,44 @@
+"""media_owner_checksum_unique
+
+Revision ID: b2f7c9e4d8a3
+Revises: a8d4e6f2c1b7
+Create Date: 2026-10-15
+
+Уникальный (owner_id, checksum_sha256) для дедупа загрузок: повтор того же
+файла тем же владельцем возвращает существующий media. Частичный — старые
+строки без checksum (NULL) не участвуют. CONCURRENTLY — без блокировки записи.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+revision: str = "b2f7c9e4d8a3"
+down_revision: Union[str, None] = "a8d4e6f2c1b7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_media_owner_checksum",
+            "media",
+            ["owner_id", "checksum_sha256"],
+            unique=True,
+            postgresql_where=sa.text("checksum_sha256 IS NOT NULL"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_media_owner_checksum",
+            table_name="media",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
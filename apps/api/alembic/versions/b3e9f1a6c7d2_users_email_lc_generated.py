@@ -0,0 +1,88 @@
+"""users_email_lc_generated
+
+Revision ID: b3e9f1a6c7d2
+Revises: 8d1c4e7a2b90
+Create Date: 2026-10-15
+
+users.email_lc — генерируемая колонка lower(email) + уникальный индекс.
+Login/register ищут по email_lc: регистр email больше не важен,
+а обычный btree по колонке дешевле expression-индекса lower(email).
+
+- Перед изменениями — проверка коллизий lower(email): при email, которые
+  различаются только регистром, уникальный индекс не построится; миграция
+  падает сразу со списком адресов, их нужно разрешить вручную (удалять
+  пользователей автоматически нельзя).
+- ADD COLUMN … STORED переписывает users под ACCESS EXCLUSIVE (таблица
+  небольшая); lock_timeout — чтобы не встать в очередь за долгой транзакцией
+  и не заблокировать всех за собой, а упасть и повторить позже.
+- Индекс — CONCURRENTLY; невалидный остаток прерванной попытки удаляется
+  перед постройкой, иначе if_not_exists молча пропустил бы его.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "b3e9f1a6c7d2"
+down_revision: Union[str, None] = "8d1c4e7a2b90"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    collisions = op.get_bind().execute(
+        sa.text(
+            "SELECT lower(email) FROM users "
+            "GROUP BY lower(email) HAVING count(*) > 1 "
+            "ORDER BY 1 LIMIT 20"
+        )
+    ).scalars().all()
+    if collisions:
+        raise RuntimeError(
+            "users.email differs only by case, resolve before migrating: "
+            + ", ".join(collisions)
+        )
+
+    op.execute("SET LOCAL lock_timeout = '5s'")
+    op.execute(
+        "ALTER TABLE users "
+        "ADD COLUMN IF NOT EXISTS email_lc text GENERATED ALWAYS AS (lower(email)) STORED"
+    )
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            """
+            DO $$
+            BEGIN
+                IF EXISTS (
+                    SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE c.relname = 'uq_users_email_lc' AND NOT i.indisvalid
+                ) THEN
+                    EXECUTE 'DROP INDEX uq_users_email_lc';
+                END IF;
+            END
+            $$
+            """
+        )
+        op.create_index(
+            "uq_users_email_lc",
+            "users",
+            ["email_lc"],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "uq_users_email_lc",
+            table_name="users",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+    op.drop_column("users", "email_lc")
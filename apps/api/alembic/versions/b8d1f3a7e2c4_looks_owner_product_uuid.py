@@ -0,0 +1,93 @@
+"""looks_owner_product_uuid
+
+Revision ID: b8d1f3a7e2c4
+Revises: c5e8a1d4f7b2
+Create Date: 2026-10-15
+
+Доводит looks / look_items до UUID-модели (e5b8f2d4a1c6 перевёл только
+looks.id, look_items.id и look_id):
+
+- looks.owner_id: varchar → uuid (users.id — uuid, API сравнивает с uuid.UUID);
+- look_items.product_id (legacy products.id) → product_id_uuid uuid
+  со ссылкой на products.id_uuid; значения берутся из products по legacy id,
+  связи на несуществующие товары удаляются. Вместе с product_id уходят
+  uq_look_items_look_product и ix_look_items_product_id — новый индекс
+  по product_id_uuid создаётся здесь, уникальность (look_id, product_id_uuid) —
+  отдельной ревизией.
+
+ALTER TYPE переписывает looks с индексами — как и в e5b8f2d4a1c6,
+таблицы небольшие.
+UUID-переход схемы (5c67d5ac037e) выполнялся вне этой цепочки, поэтому
+каждый шаг проверяет фактический тип / наличие колонки и на уже
+переведённой базе ничего не делает.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+revision: str = "b8d1f3a7e2c4"
+down_revision: Union[str, None] = "c5e8a1d4f7b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        DO $$
+        BEGIN
+            IF (SELECT data_type FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                  AND table_name = 'looks' AND column_name = 'owner_id') <> 'uuid'
+            THEN
+                ALTER TABLE looks DROP CONSTRAINT IF EXISTS looks_owner_id_fkey;
+                ALTER TABLE looks ALTER COLUMN owner_id TYPE uuid USING owner_id::uuid;
+                ALTER TABLE looks ADD CONSTRAINT looks_owner_id_fkey
+                    FOREIGN KEY (owner_id) REFERENCES users (id);
+            END IF;
+
+            IF NOT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                  AND table_name = 'look_items' AND column_name = 'product_id_uuid'
+            ) THEN
+                ALTER TABLE look_items ADD COLUMN product_id_uuid uuid;
+                UPDATE look_items li SET product_id_uuid = p.id_uuid
+                FROM products p
+                WHERE p.id = li.product_id;
+                DELETE FROM look_items WHERE product_id_uuid IS NULL;
+
+                ALTER TABLE look_items ALTER COLUMN product_id_uuid SET NOT NULL;
+                ALTER TABLE look_items DROP COLUMN product_id;
+                ALTER TABLE look_items ADD CONSTRAINT look_items_product_id_uuid_fkey
+                    FOREIGN KEY (product_id_uuid) REFERENCES products (id_uuid);
+                CREATE INDEX ix_look_items_product_id_uuid ON look_items (product_id_uuid);
+            END IF;
+        END
+        $$
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        ALTER TABLE look_items ADD COLUMN product_id varchar;
+        UPDATE look_items li SET product_id = p.id
+        FROM products p
+        WHERE p.id_uuid = li.product_id_uuid;
+        ALTER TABLE look_items ALTER COLUMN product_id SET NOT NULL;
+        ALTER TABLE look_items DROP COLUMN product_id_uuid;
+        ALTER TABLE look_items ADD CONSTRAINT look_items_product_id_fkey
+            FOREIGN KEY (product_id) REFERENCES products (id);
+        ALTER TABLE look_items ADD CONSTRAINT uq_look_items_look_product
+            UNIQUE (look_id, product_id);
+        CREATE INDEX ix_look_items_product_id ON look_items (product_id);
+
+        ALTER TABLE looks DROP CONSTRAINT IF EXISTS looks_owner_id_fkey;
+        ALTER TABLE looks ALTER COLUMN owner_id TYPE varchar USING owner_id::text;
+        """
+    )
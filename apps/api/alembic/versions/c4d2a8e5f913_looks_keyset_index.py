@@ -0,0 +1,56 @@
+"""looks_keyset_index
+
+Revision ID: c4d2a8e5f913
+Revises: b3e9f1a6c7d2
+Create Date: 2026-10-15
+
+list_looks пагинирует keyset'ом: WHERE owner_id = :u AND (updated_at, id) < (:ts, :id)
+ORDER BY updated_at DESC, id DESC. Индекс (owner_id, updated_at DESC, id DESC)
+отдаёт страницу index seek'ом на любой глубине.
+ix_looks_owner_updated — его префикс, удаляем.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "c4d2a8e5f913"
+down_revision: Union[str, None] = "b3e9f1a6c7d2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_looks_owner_updated_id",
+            "looks",
+            ["owner_id", sa.text("updated_at DESC"), sa.text("id DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_looks_owner_updated",
+            table_name="looks",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_looks_owner_updated",
+            "looks",
+            ["owner_id", "updated_at"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_looks_owner_updated_id",
+            table_name="looks",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
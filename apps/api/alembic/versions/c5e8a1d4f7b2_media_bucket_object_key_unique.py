@@ -0,0 +1,44 @@
+"""media_bucket_object_key_unique
+
+Revision ID: c5e8a1d4f7b2
+Revises: a4c7e2f9b6d1
+Create Date: 2026-10-15
+
+Уникальный (bucket, object_key): один объект MinIO — одна запись media.
+Повторный или параллельный POST /v1/media/commit того же ключа упирается
+в индекс, и API возвращает существующую строку вместо дубля.
+CONCURRENTLY — без блокировки записи.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+revision: str = "c5e8a1d4f7b2"
+down_revision: Union[str, None] = "a4c7e2f9b6d1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_media_bucket_object_key",
+            "media",
+            ["bucket", "object_key"],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_media_bucket_object_key",
+            table_name="media",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,40 @@
+"""users_products_timestamp_defaults
+
+Revision ID: c9e1a5d7b3f6
+Revises: b2f7c9e4d8a3
+Create Date: 2026-10-15
+
+created_at / updated_at для users и products по умолчанию ставит Postgres
+(naive UTC) — как для media / ai_jobs в a8d4e6f2c1b7. Только SET DEFAULT.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+revision: str = "c9e1a5d7b3f6"
+down_revision: Union[str, None] = "b2f7c9e4d8a3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_NOW_UTC = "timezone('utc', now())"
+
+_COLUMNS = [
+    ("users", "created_at"),
+    ("users", "updated_at"),
+    ("products", "created_at"),
+    ("products", "updated_at"),
+]
+
+
+def upgrade() -> None:
+    for table, column in _COLUMNS:
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET DEFAULT {_NOW_UTC}")
+
+
+def downgrade() -> None:
+    for table, column in reversed(_COLUMNS):
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} DROP DEFAULT")
@@ -0,0 +1,82 @@
+"""look_items_look_product_uuid_unique
+
+Revision ID: d2f6b9c3a8e1
+Revises: b8d1f3a7e2c4
+Create Date: 2026-10-15
+
+UNIQUE (look_id, product_id_uuid) — uq_look_items_look_product_uuid: товар
+в образе один раз; add_look_item делает INSERT … ON CONFLICT ON CONSTRAINT
+по нему (атомарно, без пробы на существование).
+
+1. Дубли, если есть, схлопываются до одной связи (меньший id).
+2. Уникальный индекс строится CONCURRENTLY (без блокировки записи);
+   невалидный остаток прерванной попытки удаляется перед постройкой,
+   иначе if_not_exists его молча пропустил бы.
+3. Ограничение поверх готового индекса — USING INDEX, без повторного скана.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+revision: str = "d2f6b9c3a8e1"
+down_revision: Union[str, None] = "b8d1f3a7e2c4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_NAME = "uq_look_items_look_product_uuid"
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        DELETE FROM look_items a
+        USING look_items b
+        WHERE a.look_id = b.look_id
+          AND a.product_id_uuid = b.product_id_uuid
+          AND a.id > b.id
+        """
+    )
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            f"""
+            DO $$
+            BEGIN
+                IF EXISTS (
+                    SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE c.relname = '{_NAME}' AND NOT i.indisvalid
+                ) THEN
+                    EXECUTE 'DROP INDEX {_NAME}';
+                END IF;
+            END
+            $$
+            """
+        )
+        op.create_index(
+            _NAME,
+            "look_items",
+            ["look_id", "product_id_uuid"],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+    op.execute(
+        f"""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = '{_NAME}') THEN
+                ALTER TABLE look_items ADD CONSTRAINT {_NAME} UNIQUE USING INDEX {_NAME};
+            END IF;
+        END
+        $$
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(f"ALTER TABLE look_items DROP CONSTRAINT IF EXISTS {_NAME}")
@@ -0,0 +1,60 @@
+"""categories_tree_json_function
+
+Revision ID: d3f8b6a2e4c9
+Revises: c9e1a5d7b3f6
+Create Date: 2026-10-15
+
+categories_tree_json(parent_id) — вложенное дерево активных категорий одним
+json: узлы собирает Postgres (json_build_object / json_agg, рекурсия по
+parent_id), API отдаёт готовую строку без разбора строк и сборки дерева
+в Python. json, а не jsonb — порядок ключей и детей сохраняется.
+plpgsql: тело SQL-функции проверяется при CREATE и не может ссылаться
+на саму себя.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+revision: str = "d3f8b6a2e4c9"
+down_revision: Union[str, None] = "c9e1a5d7b3f6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION categories_tree_json(p_parent_id varchar)
+        RETURNS json
+        LANGUAGE plpgsql STABLE
+        AS $$
+        BEGIN
+            RETURN (
+                SELECT coalesce(
+                    json_agg(
+                        json_build_object(
+                            'id', c.id,
+                            'name', c.name,
+                            'slug', c.slug,
+                            'path', c.path,
+                            'children', categories_tree_json(c.id)
+                        )
+                        ORDER BY c.sort_order NULLS LAST, c.name
+                    ),
+                    '[]'::json
+                )
+                FROM categories c
+                WHERE c.parent_id IS NOT DISTINCT FROM p_parent_id
+                  AND c.is_active IS NOT FALSE
+            );
+        END
+        $$
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP FUNCTION IF EXISTS categories_tree_json(varchar)")
@@ -0,0 +1,44 @@
+"""look_items_look_fk_cascade
+
+Revision ID: d7a3c1e9b5f4
+Revises: c4d2a8e5f913
+Create Date: 2026-10-15
+
+look_items.look_id → looks.id ON DELETE CASCADE: delete_look — один
+DELETE FROM looks, связи чистит Postgres (по ix_look_items_look_id).
+ADD CONSTRAINT … NOT VALID (короткая блокировка, строки не проверяются)
+коммитится сразу; VALIDATE идёт в autocommit_block отдельной транзакцией
+под SHARE UPDATE EXCLUSIVE — проверка существующих строк не блокирует
+запись в look_items. В одной транзакции с ADD блокировка ADD держалась бы
+до конца VALIDATE.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+revision: str = "d7a3c1e9b5f4"
+down_revision: Union[str, None] = "c4d2a8e5f913"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _replace_fk(on_delete: str) -> None:
+    op.execute("ALTER TABLE look_items DROP CONSTRAINT IF EXISTS look_items_look_id_fkey")
+    op.execute(
+        "ALTER TABLE look_items ADD CONSTRAINT look_items_look_id_fkey "
+        f"FOREIGN KEY (look_id) REFERENCES looks (id) {on_delete} NOT VALID"
+    )
+    # autocommit_block коммитит DROP/ADD выше и снимает их блокировки
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TABLE look_items VALIDATE CONSTRAINT look_items_look_id_fkey")
+
+
+def upgrade() -> None:
+    _replace_fk("ON DELETE CASCADE")
+
+
+def downgrade() -> None:
+    _replace_fk("")
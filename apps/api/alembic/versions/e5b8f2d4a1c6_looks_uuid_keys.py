@@ -0,0 +1,48 @@
+"""looks_uuid_keys
+
+Revision ID: e5b8f2d4a1c6
+Revises: d7a3c1e9b5f4
+Create Date: 2026-10-15
+
+looks.id, look_items.id, look_items.look_id: varchar → native uuid.
+16 байт вместо ~36 символов текста: ключи индексов (PK, ix_look_items_look_id,
+ix_looks_owner_updated_id) почти в 2.5 раза уже, параметры идут бинарно,
+без разбора строки в uuid на каждом сравнении.
+ALTER TYPE переписывает таблицы (и индексы) — looks / look_items небольшие.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+revision: str = "e5b8f2d4a1c6"
+down_revision: Union[str, None] = "d7a3c1e9b5f4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _convert(sql_type: str) -> None:
+    # FK мешает сменить тип с обеих сторон — снимаем и возвращаем (тот же CASCADE)
+    op.execute("ALTER TABLE look_items DROP CONSTRAINT IF EXISTS look_items_look_id_fkey")
+
+    op.execute(f"ALTER TABLE looks ALTER COLUMN id TYPE {sql_type} USING id::{sql_type}")
+    op.execute(
+        "ALTER TABLE look_items "
+        f"ALTER COLUMN id TYPE {sql_type} USING id::{sql_type}, "
+        f"ALTER COLUMN look_id TYPE {sql_type} USING look_id::{sql_type}"
+    )
+
+    op.execute(
+        "ALTER TABLE look_items ADD CONSTRAINT look_items_look_id_fkey "
+        "FOREIGN KEY (look_id) REFERENCES looks (id) ON DELETE CASCADE"
+    )
+
+
+def upgrade() -> None:
+    _convert("uuid")
+
+
+def downgrade() -> None:
+    _convert("varchar")
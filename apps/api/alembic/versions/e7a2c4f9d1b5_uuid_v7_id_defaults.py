@@ -0,0 +1,73 @@
+"""uuid_v7_id_defaults
+
+Revision ID: e7a2c4f9d1b5
+Revises: d3f8b6a2e4c9
+Create Date: 2026-10-15
+
+uuid_generate_v7() — UUIDv7 (RFC 9562) на стороне Postgres: первые 48 бит —
+unix-время в мс (clock_timestamp, растёт и внутри транзакции), остальное —
+случайные биты из gen_random_uuid(); биты 52/53 переводят версию 4 → 7.
+Встроенный uuidv7() появится только в PG18.
+Server default'ы id для categories / media / ai_jobs переводятся с
+gen_random_uuid() на неё: новые ключи монотонны, вставки в PK-индекс идут
+в правый край, а не в случайную страницу. Только SET DEFAULT, старые id
+не трогаем.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+revision: str = "e7a2c4f9d1b5"
+down_revision: Union[str, None] = "d3f8b6a2e4c9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_NEW_ID_V7 = "uuid_generate_v7()::text"
+_NEW_ID_V4 = "gen_random_uuid()::text"
+
+_ID_COLUMNS = [
+    ("categories", "id"),
+    ("media", "id"),
+    ("ai_jobs", "id"),
+]
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION uuid_generate_v7()
+        RETURNS uuid
+        LANGUAGE sql VOLATILE
+        AS $$
+            SELECT encode(
+                set_bit(
+                    set_bit(
+                        overlay(
+                            uuid_send(gen_random_uuid())
+                            PLACING substring(
+                                int8send(floor(extract(epoch FROM clock_timestamp()) * 1000)::bigint)
+                                FROM 3
+                            )
+                            FROM 1 FOR 6
+                        ),
+                        52, 1
+                    ),
+                    53, 1
+                ),
+                'hex'
+            )::uuid
+        $$
+        """
+    )
+    for table, column in _ID_COLUMNS:
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET DEFAULT {_NEW_ID_V7}")
+
+
+def downgrade() -> None:
+    for table, column in reversed(_ID_COLUMNS):
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET DEFAULT {_NEW_ID_V4}")
+    op.execute("DROP FUNCTION IF EXISTS uuid_generate_v7()")
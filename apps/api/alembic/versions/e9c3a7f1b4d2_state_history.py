@@ -0,0 +1,47 @@
+"""state_history
+
+Revision ID: e9c3a7f1b4d2
+Revises: d2f6b9c3a8e1
+Create Date: 2026-10-15
+
+Таблица state_history — журнал событий / переходов (state_service:
+record_event, change_state). Модель StateHistory в коде была, таблицы
+в цепочке миграций — нет. IF NOT EXISTS: на базе, где её создали вручную,
+ревизия ничего не делает.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+revision: str = "e9c3a7f1b4d2"
+down_revision: Union[str, None] = "d2f6b9c3a8e1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS state_history (
+            id uuid PRIMARY KEY,
+            entity_type varchar NOT NULL,
+            entity_id varchar NOT NULL,
+            from_state varchar,
+            to_state varchar,
+            event varchar NOT NULL,
+            actor varchar,
+            created_at timestamp NOT NULL DEFAULT timezone('utc', now())
+        )
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_state_history_entity "
+        "ON state_history (entity_type, entity_id, created_at)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS state_history")
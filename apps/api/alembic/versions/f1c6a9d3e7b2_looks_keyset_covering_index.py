@@ -0,0 +1,60 @@
+"""looks_keyset_covering_index
+
+Revision ID: f1c6a9d3e7b2
+Revises: e5b8f2d4a1c6
+Create Date: 2026-10-15
+
+Keyset-индекс list_looks делаем покрывающим: INCLUDE (title, occasion,
+season, created_at) — вместе с ключом это все колонки looks, которые
+читает list_looks, и страница отдаётся index-only scan'ом, без heap.
+Заменяет ix_looks_owner_updated_id (тот же ключ без INCLUDE).
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+revision: str = "f1c6a9d3e7b2"
+down_revision: Union[str, None] = "e5b8f2d4a1c6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_KEY = ["owner_id", sa.text("updated_at DESC"), sa.text("id DESC")]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_looks_owner_updated_id_incl",
+            "looks",
+            _KEY,
+            postgresql_include=["title", "occasion", "season", "created_at"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_looks_owner_updated_id",
+            table_name="looks",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_looks_owner_updated_id",
+            "looks",
+            _KEY,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_looks_owner_updated_id_incl",
+            table_name="looks",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
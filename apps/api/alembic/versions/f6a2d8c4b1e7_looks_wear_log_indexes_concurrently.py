@@ -0,0 +1,70 @@
+"""looks_wear_log_indexes_concurrently
+
+Revision ID: f6a2d8c4b1e7
+Revises: e9c3a7f1b4d2
+Create Date: 2026-10-15
+
+Вторичные индексы looks / look_items / wear_log из 390e5cfa9a80 — без
+блокировки записи. Сама 390e5cfa9a80 уже применена и не меняется: там
+индексы строятся в одной транзакции с CREATE TABLE по пустым таблицам.
+Здесь — на живых данных: если индекса нет (удалён вручную, база собрана
+в обход цепочки) или он остался INVALID после прерванной постройки,
+он строится заново CONCURRENTLY. Невалидный остаток удаляется перед
+постройкой, иначе if_not_exists его молча пропустил бы. На базе
+с целыми индексами ревизия ничего не делает.
+
+ix_looks_owner_updated (удалён в c4d2a8e5f913) и ix_look_items_product_id
+(ушёл вместе с product_id в b8d1f3a7e2c4) сюда не входят.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+revision: str = "f6a2d8c4b1e7"
+down_revision: Union[str, None] = "e9c3a7f1b4d2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_INDEXES = [
+    ("ix_looks_owner_id", "looks", ["owner_id"]),
+    ("ix_looks_owner_created", "looks", ["owner_id", "created_at"]),
+    ("ix_look_items_look_id", "look_items", ["look_id"]),
+    ("ix_wear_log_owner_id", "wear_log", ["owner_id"]),
+    ("ix_wear_log_owner_worn_at", "wear_log", ["owner_id", "worn_at"]),
+    ("ix_wear_log_product_worn_at", "wear_log", ["product_id", "worn_at"]),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in _INDEXES:
+            op.execute(
+                f"""
+                DO $$
+                BEGIN
+                    IF EXISTS (
+                        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                        WHERE c.relname = '{name}' AND NOT i.indisvalid
+                    ) THEN
+                        EXECUTE 'DROP INDEX {name}';
+                    END IF;
+                END
+                $$
+                """
+            )
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    # Индексы принадлежат 390e5cfa9a80 и удаляются её downgrade
+    pass
@@ -1,29 +1,23 @@
+import asyncio
+import multiprocessing
 import os
+import time
 import uuid
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Generator, Optional
+from typing import Optional
 
+import jwt
+from cachetools import TTLCache
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from pydantic import BaseModel, EmailStr
-from sqlalchemy.orm import Session
+from pydantic import BaseModel, ConfigDict, EmailStr
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from models import User
-
-# DB dependency
-try:
-    from db import get_db  # type: ignore
-except Exception:
-    from db import SessionLocal  # type: ignore
-
-    def get_db() -> Generator[Session, None, None]:
-        db = SessionLocal()
-        try:
-            yield db
-        finally:
-            db.close()
+from db import AsyncSessionLocal, get_async_db
+from models import User, uuid7
+from passwords import bcrypt_hash, bcrypt_verify
 
 
 # ---------------- Config ----------------
@@ -35,7 +29,18 @@ JWT_EXPIRES_MIN = int((os.getenv("JWT_EXPIRES_MIN") or "43200").strip())  # 30 
 if not JWT_SECRET:
     raise RuntimeError("JWT_SECRET is not set")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# пул есть в каждом процессе uvicorn (WEB_CONCURRENCY): по умолчанию
+# ядра делятся между ними, а не cpu_count процессов на каждый
+_WEB_CONCURRENCY = int((os.getenv("WEB_CONCURRENCY") or "1").strip())
+BCRYPT_WORKERS = int(
+    (os.getenv("BCRYPT_WORKERS") or str(max(1, (os.cpu_count() or 1) // _WEB_CONCURRENCY))).strip()
+)
+
+# bcrypt — CPU-bound (50–200 ms): считаем в отдельных процессах, не в event loop.
+# spawn — чтобы не форкать процесс uvicorn с живыми потоками.
+# Пул создаётся при первом hash/verify (не при импорте): скрипты и воркер,
+# импортирующие auth, процессов не поднимают; закрывает его lifespan API.
+_bcrypt_pool: ProcessPoolExecutor | None = None
 bearer = HTTPBearer(auto_error=False)
 
 router = APIRouter(prefix="/v1/auth", tags=["auth"])
@@ -47,12 +52,40 @@ def _now_utc() -> datetime:
     return datetime.now(timezone.utc)
 
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+def _now_db() -> datetime:
+    """
+    now для колонок DateTime (timestamp without time zone, naive UTC).
+    asyncpg не принимает aware datetime для таких колонок.
+    """
+    return _now_utc().replace(tzinfo=None)
+
+
+def _get_bcrypt_pool() -> ProcessPoolExecutor:
+    # вызывается только из event loop — гонки за создание нет
+    global _bcrypt_pool
+    if _bcrypt_pool is None:
+        _bcrypt_pool = ProcessPoolExecutor(
+            max_workers=BCRYPT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _bcrypt_pool
+
+
+def shutdown_bcrypt_pool() -> None:
+    global _bcrypt_pool
+    if _bcrypt_pool is not None:
+        _bcrypt_pool.shutdown(wait=True, cancel_futures=True)
+        _bcrypt_pool = None
 
 
-def verify_password(password: str, password_hash: str) -> bool:
-    return pwd_context.verify(password, password_hash)
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_bcrypt_pool(), bcrypt_hash, password)
+
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_bcrypt_pool(), bcrypt_verify, password, password_hash)
 
 
 def create_access_token(*, sub: str) -> str:
@@ -71,36 +104,60 @@ def create_access_token(*, sub: str) -> str:
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALG)
 
 
+# token -> (sub, exp): SPA шлёт один и тот же токен на каждый запрос,
+# повторный HMAC + JSON parse не нужен. exp перепроверяем на каждом hit.
+_token_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+
 def decode_token(token: str) -> str:
+    cached = _token_cache.get(token)
+    if cached is not None:
+        sub, exp = cached
+        if exp > time.time():
+            return sub
+        _token_cache.pop(token, None)
+        raise HTTPException(status_code=401, detail="Invalid token")
+
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
         user_id = payload.get("sub")
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
-        return str(user_id)
-    except JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    sub = str(user_id)
+    exp = payload.get("exp")
+    if exp is not None:
+        _token_cache[token] = (sub, int(exp))
+    return sub
 
-def get_current_user(
+
+async def get_current_user(
     creds: Optional[HTTPAuthorizationCredentials] = Depends(bearer),
-    db: Session = Depends(get_db),
 ) -> User:
     if creds is None or not creds.credentials:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    user_id = decode_token(creds.credentials)
+    # users.id — UUID: невалидный sub сразу 401, без запроса в БД
+    try:
+        user_id = uuid.UUID(decode_token(creds.credentials))
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Invalid token")
 
-    # Обычно строка ок (и для UUID-колонки Postgres тоже часто кастится),
-    # поэтому оставляем сравнение со строкой.
-    u = db.query(User).filter(User.id == user_id).first()
+    # своя короткая сессия, а не Depends(get_async_db): соединение уходит
+    # в пул сразу после lookup'а, а не висит idle in transaction до конца
+    # запроса (sync-роуты берут своё, pgbouncer не держит backend).
+    # Возвращается detached User с уже загруженными колонками.
+    async with AsyncSessionLocal() as db:
+        u = await db.get(User, user_id)
     if not u:
         raise HTTPException(status_code=401, detail="User not found")
 
     # soft-delete / disable
-    if getattr(u, "deleted_at", None) is not None:
+    if u.deleted_at is not None:
         raise HTTPException(status_code=401, detail="User deleted")
-    if getattr(u, "is_active", True) is False:
+    if not u.is_active:
         raise HTTPException(status_code=401, detail="User inactive")
 
     return u
@@ -118,16 +175,22 @@ class LoginReq(BaseModel):
     password: str
 
 
+# from_attributes: схема собирается прямо из ORM User (pydantic-core),
+# uuid/datetime сериализуются в JSON без ручных str()/isoformat()
 class MeResp(BaseModel):
-    id: str
+    model_config = ConfigDict(from_attributes=True)
+
+    id: uuid.UUID
     email: str
-    created_at: Optional[str] = None
+    created_at: Optional[datetime] = None
 
 
 class UserPublic(BaseModel):
-    id: str
+    model_config = ConfigDict(from_attributes=True)
+
+    id: uuid.UUID
     email: str
-    created_at: Optional[str] = None
+    created_at: Optional[datetime] = None
 
 
 class AuthResp(BaseModel):
@@ -140,97 +203,91 @@ class AuthResp(BaseModel):
 # ---------------- Routes ----------------
 
 @router.post("/register", response_model=AuthResp)
-def register(payload: RegisterReq, db: Session = Depends(get_db)):
+async def register(payload: RegisterReq, db: AsyncSession = Depends(get_async_db)):
     email = payload.email.strip().lower()
     if len(payload.password) < 8:
         raise HTTPException(status_code=400, detail="Password must be at least 8 characters")
 
-    now = datetime.utcnow()
-    user = db.query(User).filter(User.email == email).first()
+    now = _now_db()
+    user = (await db.execute(select(User).where(User.email_lc == email))).scalar_one_or_none()
 
     # 1) Уже существует и активен
-    if user and getattr(user, "deleted_at", None) is None and getattr(user, "is_active", True):
+    if user and user.deleted_at is None and user.is_active:
         raise HTTPException(status_code=409, detail="Email already registered")
 
-    # 2) Существует, но был soft-delete / выключен — восстановим
+    password_hash = await hash_password(payload.password)
+
+    # 2) Существует, но был soft-delete / выключен — восстановим.
+    # Один UPDATE без unit of work и refresh: в ответ идут id / email /
+    # created_at, которые он не меняет
     if user:
-        user.password_hash = hash_password(payload.password)
-        user.is_active = True
-        user.deleted_at = None
-        if hasattr(user, "updated_at"):
-            user.updated_at = now
-        db.commit()
-        db.refresh(user)
+        await db.execute(
+            update(User)
+            .where(User.id == user.id)
+            .values(password_hash=password_hash, is_active=True, deleted_at=None, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
     else:
         # 3) Новый пользователь
         user = User(
-            id=str(uuid.uuid4()),
+            id=uuid7(),
             email=email,
-            password_hash=hash_password(payload.password),
+            password_hash=password_hash,
             is_active=True,
             created_at=now,
+            updated_at=now,
             deleted_at=None,
         )
-        if hasattr(user, "updated_at"):
-            user.updated_at = now
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
 
     token = create_access_token(sub=user.id)
 
     return AuthResp(
         access_token=token,
         token_type="bearer",
-        user=UserPublic(
-            id=str(user.id),
-            email=user.email,
-            created_at=user.created_at.isoformat() if getattr(user, "created_at", None) else None,
-        ),
+        user=UserPublic.model_validate(user),
     )
 
 
 @router.post("/login", response_model=AuthResp)
-def login(payload: LoginReq, db: Session = Depends(get_db)):
+async def login(payload: LoginReq, db: AsyncSession = Depends(get_async_db)):
     email = payload.email.strip().lower()
 
-    u = db.query(User).filter(User.email == email).first()
+    u = (await db.execute(select(User).where(User.email_lc == email))).scalar_one_or_none()
     if not u:
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
-    if getattr(u, "deleted_at", None) is not None or getattr(u, "is_active", True) is False:
+    if u.deleted_at is not None or not u.is_active:
         raise HTTPException(status_code=401, detail="User not found or inactive")
 
-    if not verify_password(payload.password, u.password_hash):
+    if not await verify_password(payload.password, u.password_hash):
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
     # FIX: create_access_token сам приводит sub к str
     return AuthResp(
         access_token=create_access_token(sub=u.id),
         token_type="bearer",
-        user=UserPublic(
-            id=str(u.id),
-            email=u.email,
-            created_at=u.created_at.isoformat() if getattr(u, "created_at", None) else None,
-        ),
+        user=UserPublic.model_validate(u),
     )
 
 
 @router.get("/me", response_model=MeResp)
-def me(user: User = Depends(get_current_user)):
-    return MeResp(
-        id=str(user.id),
-        email=user.email,
-        created_at=user.created_at.isoformat() if getattr(user, "created_at", None) else None,
-    )
+async def me(user: User = Depends(get_current_user)):
+    return MeResp.model_validate(user)
 
 
 @router.delete("/me")
-def delete_me(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    # soft delete
-    user.is_active = False
-    user.deleted_at = datetime.utcnow()
-    if hasattr(user, "updated_at"):
-        user.updated_at = datetime.utcnow()
-    db.commit()
+async def delete_me(db: AsyncSession = Depends(get_async_db), user: User = Depends(get_current_user)):
+    # soft delete — одним UPDATE, без dirty-tracking загруженного объекта
+    now = _now_db()
+    await db.execute(
+        update(User)
+        .where(User.id == user.id)
+        .values(is_active=False, deleted_at=now, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
     return {"status": "ok"}
\ No newline at end of file
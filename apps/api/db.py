@@ -1,8 +1,12 @@
 # db.py
 import os
-from typing import Generator
+import uuid
+from contextlib import contextmanager
+from typing import AsyncGenerator, Generator, Iterator
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
 
 from models import Base  # ✅ безопасно: Base живёт в models
@@ -12,8 +16,64 @@ DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set (check .env and docker compose env_file)")
 
+
+def _async_url(url: str) -> str:
+    """
+    Тот же DATABASE_URL, но с драйвером asyncpg (для API).
+    Worker и Alembic остаются на psycopg2.
+    """
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+def _env_int(name: str, default: int) -> int:
+    return int((os.getenv(name) or str(default)).strip())
+
+
+# Пул API: дефолтные 5+10 упираются в потолок уже при ~15 параллельных запросах
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 20)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 40)
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 3600)  # сек
+# pre-ping — лишний round trip на каждый checkout; мёртвые соединения
+# и так отсекает recycle, а обрыв посреди запроса ping не спасает
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "0").strip() == "1"
+# prepared statements asyncpg на соединение: повторные запросы не парсятся
+# и не планируются заново (только без PgBouncer — см. ниже)
+DB_STATEMENT_CACHE_SIZE = _env_int("DB_STATEMENT_CACHE_SIZE", 1024)
+
+# Sync-пул (sync-роуты в threadpool, worker, startup): дефолтные 5+10
+# и 30 с ожидания дают обрыв latency уже при ~15 параллельных запросах —
+# пул шире, а при исчерпании — быстрый отказ вместо очереди
+DB_SYNC_POOL_SIZE = _env_int("DB_SYNC_POOL_SIZE", 20)
+DB_SYNC_MAX_OVERFLOW = _env_int("DB_SYNC_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 5)  # сек
+
+# За PgBouncer (transaction pooling) серверные prepared statements
+# не переживают смену backend-соединения — кэш asyncpg выключаем.
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0").strip() == "1"
+
+
+def _async_connect_args() -> dict:
+    if not DB_PGBOUNCER:
+        return {
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            # JIT Postgres только удлиняет планирование коротких OLTP-запросов
+            "server_settings": {"jit": "off"},
+        }
+    return {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+    }
+
+
+# ---------------- sync (worker / alembic / startup) ----------------
+
 engine = create_engine(
     DATABASE_URL,
+    pool_size=DB_SYNC_POOL_SIZE,
+    max_overflow=DB_SYNC_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
     pool_pre_ping=True,
     future=True,
 )
@@ -25,6 +85,24 @@ SessionLocal = sessionmaker(
     future=True,
 )
 
+# ---------------- async (API handlers) ----------------
+
+async_engine = create_async_engine(
+    _async_url(DATABASE_URL),
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args=_async_connect_args(),
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,  # объекты читаются после commit (без lazy IO)
+)
+
 
 def init_db() -> None:
     """
@@ -36,9 +114,24 @@ def init_db() -> None:
         Base.metadata.create_all(bind=engine)
 
 
+@contextmanager
+def db_scope() -> Iterator[Session]:
+    """
+    Сессия на время блока, а не всего запроса: соединение возвращается в пул
+    до сериализации ответа и middleware (Depends(get_db) держит его до конца).
+    """
+    with SessionLocal() as db:
+        yield db
+
+
 def get_db() -> Generator[Session, None, None]:
     db: Session = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,28 +1,59 @@
 from __future__ import annotations
 
+import functools
+import hashlib
+import json
 import os
+import random
 import time
 import logging
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from typing import Optional, Tuple
 from uuid import UUID
 
-import requests
+import httpx
+import orjson
 from meilisearch import Client as MeiliClient
+from meilisearch.errors import MeilisearchCommunicationError
+from sqlalchemy import BigInteger, cast, func, insert, select, update
 
 from db import SessionLocal
 from models import (
     AIJob,
     Media,
     Product,
-    Category,
     ProductState,
     AIJobState,
+    product_media_json,
+    uuid7,
 )
-from state_service import change_state
+from queueing import get_redis
+from state_service import record_event
 
 logger = logging.getLogger(__name__)
 
+# =============================================================================
+# AI SERVICE CLIENT
+# =============================================================================
+
+AI_INTERNAL_URL = (os.getenv("AI_INTERNAL_URL") or "http://ai:8002").strip()
+
+AI_CONNECT_RETRIES = int(os.getenv("AI_CONNECT_RETRIES") or "2")
+
+# один пул keep-alive соединений на процесс: без TCP handshake на каждый job.
+# Переживает job'ы только в SimpleWorker (RQ_WORKER_CLASS=simple, см. worker.py):
+# обычный Worker форкает на каждый job, и пул умирает вместе с дочерним процессом.
+# retries — только на ошибки установки соединения (ai перезапускается),
+# сам POST повторно не шлём.
+_AI_CLIENT = httpx.Client(
+    base_url=AI_INTERNAL_URL,
+    timeout=httpx.Timeout(120, connect=5),
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+    transport=httpx.HTTPTransport(retries=AI_CONNECT_RETRIES),
+)
+
 # =============================================================================
 # MEILI CONFIG
 # =============================================================================
@@ -30,7 +61,12 @@ logger = logging.getLogger(__name__)
 _MEILI_FILTERABLE = ["status", "owner_id", "category_id", "tags"]
 _MEILI_SORTABLE = ["updated_at"]
 
+# для сравнения с текущими settings: порядок атрибутов Meili не важен
+_MEILI_FILTERABLE_SET = frozenset(_MEILI_FILTERABLE)
+_MEILI_SORTABLE_SET = frozenset(_MEILI_SORTABLE)
+
 
+@functools.lru_cache(maxsize=1)
 def _meili_cfg() -> Tuple[Optional[str], Optional[str], Optional[str]]:
     host = (os.getenv("MEILI_HOST") or "").strip()
     key = (os.getenv("MEILI_MASTER_KEY") or "").strip()
@@ -45,6 +81,68 @@ def _meili_cfg() -> Tuple[Optional[str], Optional[str], Optional[str]]:
     return host, key, index_name
 
 
+_MEILI_CLIENT: Optional[MeiliClient] = None
+_MEILI_CLIENT_LOCK = threading.Lock()
+
+
+def _meili_client() -> Optional[MeiliClient]:
+    """
+    Один MeiliClient на процесс (и его HTTP-сессия с keep-alive)
+    для init_meili и index_product.
+    None — Meili не сконфигурирован.
+    """
+    global _MEILI_CLIENT
+    if _MEILI_CLIENT is None:
+        host, key, _ = _meili_cfg()
+        if not host or not key:
+            return None
+        with _MEILI_CLIENT_LOCK:
+            if _MEILI_CLIENT is None:
+                _MEILI_CLIENT = MeiliClient(host, key)
+    return _MEILI_CLIENT
+
+
+_MEILI_HTTP: Optional[httpx.Client] = None
+
+
+def _meili_http() -> Optional[httpx.Client]:
+    """
+    httpx-клиент для записи документов: тело кодируем orjson сами,
+    минуя stdlib json.dumps внутри meilisearch-python.
+    None — Meili не сконфигурирован.
+    """
+    global _MEILI_HTTP
+    if _MEILI_HTTP is None:
+        host, key, _ = _meili_cfg()
+        if not host or not key:
+            return None
+        with _MEILI_CLIENT_LOCK:
+            if _MEILI_HTTP is None:
+                _MEILI_HTTP = httpx.Client(
+                    base_url=host,
+                    headers={"Authorization": f"Bearer {key}", "Content-Type": "application/json"},
+                    timeout=httpx.Timeout(30, connect=5),
+                )
+    return _MEILI_HTTP
+
+
+def _meili_add_documents_raw(http: httpx.Client, index_name: str, docs: list[dict]) -> None:
+    resp = http.post(
+        f"/indexes/{index_name}/documents",
+        params={"primaryKey": "id_uuid"},
+        content=orjson.dumps(docs),
+    )
+    resp.raise_for_status()
+
+
+def _meili_delete_documents_raw(http: httpx.Client, index_name: str, ids: list[str]) -> None:
+    resp = http.post(
+        f"/indexes/{index_name}/documents/delete-batch",
+        content=orjson.dumps(ids),
+    )
+    resp.raise_for_status()
+
+
 def _task_uid(task_info) -> Optional[int]:
     if not task_info:
         return None
@@ -53,16 +151,37 @@ def _task_uid(task_info) -> Optional[int]:
     return getattr(task_info, "task_uid", None)
 
 
-def _wait_task(client: MeiliClient, task_uid: int, timeout_s: int = 30) -> None:
+def _wait_task(client: MeiliClient, task_uid: int, timeout_s: int = 30) -> Optional[str]:
+    """
+    Ждём завершения задачи Meili. Возвращает финальный status
+    ("succeeded" / "failed") или None по таймауту.
+    """
     deadline = time.time() + timeout_s
+    delay = 0.05  # быстрые задачи ловим сразу, долгие — не долбим опросами
     while time.time() < deadline:
+        factor = 2
         try:
             t = client.get_task(task_uid)
-            if t.get("status") in ("succeeded", "failed"):
-                return
+            if (status := t.get("status")) in ("succeeded", "failed"):
+                return status
+        except MeilisearchCommunicationError:
+            factor = 4  # Meili недоступен / перегружен — отступаем быстрее
         except Exception:
             pass
-        time.sleep(0.25)
+        # jitter: воркеры, стартовавшие одновременно, не опрашивают синхронно
+        time.sleep(delay * (0.5 + random.random()))
+        delay = min(delay * factor, 2.0)
+    return None
+
+
+@functools.lru_cache(maxsize=1)
+def _meili_settings_fp() -> str:
+    payload = {"f": sorted(_MEILI_FILTERABLE_SET), "s": sorted(_MEILI_SORTABLE_SET)}
+    return hashlib.sha1(json.dumps(payload).encode()).hexdigest()
+
+
+def _meili_fp_key(index_name: str) -> str:
+    return f"meili:settings_fp:{index_name}"
 
 
 # =============================================================================
@@ -70,36 +189,62 @@ def _wait_task(client: MeiliClient, task_uid: int, timeout_s: int = 30) -> None:
 # =============================================================================
 
 def init_meili() -> None:
-    host, key, index_name = _meili_cfg()
-    if not host or not key:
+    client = _meili_client()
+    if client is None:
         logger.info("[meili] init skipped (not configured)")
         return
 
-    client = MeiliClient(host, key)
+    _, _, index_name = _meili_cfg()
+    fp = _meili_settings_fp()
+    fp_key = _meili_fp_key(index_name)
+
+    # проба индекса (Meili) и чтение fingerprint (Redis) не зависят друг от друга —
+    # идут параллельно: старт ждёт max(RTT), а не сумму
+    redis = get_redis()
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_index = ex.submit(client.get_index, index_name)
+        f_fp = ex.submit(redis.get, fp_key)
 
-    # ensure index exists
+    # ensure index exists (create → settings — строго последовательно)
+    created = False
     try:
-        idx = client.get_index(index_name)
+        idx = f_index.result()
     except Exception:
         task = client.create_index(index_name, {"primaryKey": "id_uuid"})
         if (uid := _task_uid(task)):
             _wait_task(client, uid)
-        idx = client.get_index(index_name)
+        idx = client.index(index_name)  # handle без лишнего GET
+        created = True
+
+    # настройки уже применены этим же набором атрибутов (fingerprint в Redis) —
+    # не трогаем Meili вовсе: лишний PATCH settings = полная переиндексация
+    try:
+        if not created and f_fp.result() == fp.encode():
+            logger.info("[meili] ready index=%s (settings fingerprint unchanged)", index_name)
+            return
+    except Exception:
+        logger.warning("[meili] settings fingerprint unavailable, checking Meili")
 
     # ensure settings
     settings = idx.get_settings()
-    tasks: list[int] = []
+    changes: dict[str, list[str]] = {}
+
+    if frozenset(settings.get("filterableAttributes") or ()) != _MEILI_FILTERABLE_SET:
+        changes["filterableAttributes"] = _MEILI_FILTERABLE
 
-    if sorted(settings.get("filterableAttributes", [])) != sorted(_MEILI_FILTERABLE):
-        if (uid := _task_uid(idx.update_filterable_attributes(_MEILI_FILTERABLE))):
-            tasks.append(uid)
+    if frozenset(settings.get("sortableAttributes") or ()) != _MEILI_SORTABLE_SET:
+        changes["sortableAttributes"] = _MEILI_SORTABLE
 
-    if sorted(settings.get("sortableAttributes", [])) != sorted(_MEILI_SORTABLE):
-        if (uid := _task_uid(idx.update_sortable_attributes(_MEILI_SORTABLE))):
-            tasks.append(uid)
+    # все изменения — одной задачей (одна переиндексация, одно ожидание)
+    applied = True
+    if changes and (uid := _task_uid(idx.update_settings(changes))):
+        applied = _wait_task(client, uid) == "succeeded"
 
-    for uid in tasks:
-        _wait_task(client, uid)
+    if applied:
+        try:
+            redis.set(fp_key, fp)
+        except Exception:
+            logger.warning("[meili] failed to store settings fingerprint")
 
     logger.info("[meili] ready index=%s", index_name)
 
@@ -108,12 +253,196 @@ def init_meili() -> None:
 # HELPERS
 # =============================================================================
 
-def _update_product_text(product: Product, ai: dict) -> None:
-    if not product.title and ai.get("title_suggested"):
-        product.title = ai["title_suggested"]
+def _now_db() -> datetime:
+    # колонки DateTime — naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 
-    if not product.description:
-        product.description = ai.get("description_draft") or "Описание будет уточнено."
+def _update_product_text(values: dict, ai: dict) -> None:
+    if not values.get("title") and ai.get("title_suggested"):
+        values["title"] = ai["title_suggested"]
+
+    if not values.get("description"):
+        values["description"] = ai.get("description_draft") or "Описание будет уточнено."
+
+
+# =============================================================================
+# SEARCH INDEX
+# =============================================================================
+
+# media товара собирает Postgres (коррелированный json_agg в том же SELECT):
+# готовый list[dict] без второго запроса и без цикла по строкам в Python
+_PRODUCT_MEDIA_JSON = product_media_json(with_storage=True)
+
+# Core-select колонок документа: строка-кортеж без ORM-объекта и identity map
+_PRODUCT_DOC_COLS = (
+    Product.id_uuid,
+    Product.owner_id,
+    Product.status,
+    Product.title,
+    Product.description,
+    Product.category_id,
+    Product.attributes,
+    Product.tags,
+    # sortable: unix-время считает Postgres (naive UTC в БД), без datetime в Python
+    cast(func.extract("epoch", func.coalesce(Product.updated_at, Product.created_at)), BigInteger),
+    _PRODUCT_MEDIA_JSON,
+)
+
+
+def _product_doc(row) -> dict:
+    pid, owner_id, status, title, description, category_id, attributes, tags, updated_at, media = row
+    return {
+        "id_uuid": str(pid),
+        "owner_id": str(owner_id),
+        "status": status,
+        "title": title,
+        "description": description,
+        "category_id": category_id,
+        "attributes": attributes or {},
+        "tags": tags or [],
+        "media": media or [],
+        "updated_at": updated_at or 0,
+    }
+
+
+MEILI_BATCH_SIZE = int(os.getenv("MEILI_BATCH_SIZE") or "500")
+MEILI_FLUSH_MS = int(os.getenv("MEILI_FLUSH_MS") or "250")
+
+
+class MeiliBatcher:
+    """
+    Копит документы и отправляет их пачкой: один add_documents / delete_documents
+    на MEILI_BATCH_SIZE товаров или раз в MEILI_FLUSH_MS, а не HTTP-запрос на товар.
+
+    pending — dict по id_uuid: повторные индексации одного товара схлопываются,
+    побеждает последняя (None — удалить документ).
+    """
+
+    def __init__(self, batch_size: int, flush_ms: int) -> None:
+        self._batch_size = max(1, batch_size)
+        self._flush_s = max(1, flush_ms) / 1000
+        self._pending: dict[str, Optional[dict]] = {}
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="meili-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, product_id_uuid: str, doc: Optional[dict]) -> None:
+        with self._cond:
+            self._pending[product_id_uuid] = doc
+            if len(self._pending) >= self._batch_size:
+                self._cond.notify()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stopped or len(self._pending) >= self._batch_size,
+                    timeout=self._flush_s,
+                )
+                stopped = self._stopped
+            self.flush()
+            if stopped:
+                return
+
+    def flush(self) -> None:
+        with self._send_lock:
+            with self._cond:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+
+            http = _meili_http()
+            if http is None:
+                return
+            _, _, index_name = _meili_cfg()
+
+            upserts = [doc for doc in batch.values() if doc is not None]
+            deletes = [pid for pid, doc in batch.items() if doc is None]
+            try:
+                if upserts:
+                    _meili_add_documents_raw(http, index_name, upserts)
+                if deletes:
+                    _meili_delete_documents_raw(http, index_name, deletes)
+            except Exception:
+                logger.exception("[meili] batch flush failed size=%s", len(batch))
+                # вернуть в буфер, не затирая то, что пришло новее
+                with self._cond:
+                    for pid, doc in batch.items():
+                        self._pending.setdefault(pid, doc)
+                return
+
+            logger.info("[meili] batch flush upserts=%s deletes=%s", len(upserts), len(deletes))
+
+
+_MEILI_BATCHER: Optional[MeiliBatcher] = None
+
+
+def start_meili_batcher() -> None:
+    """
+    Включает пакетную индексацию в текущем процессе.
+    Только для долгоживущего процесса (SimpleWorker): форкнутый на job
+    процесс завершается через os._exit, и буфер был бы потерян.
+    """
+    global _MEILI_BATCHER
+    if _MEILI_BATCHER is None:
+        _MEILI_BATCHER = MeiliBatcher(MEILI_BATCH_SIZE, MEILI_FLUSH_MS)
+        _MEILI_BATCHER.start()
+
+
+def stop_meili_batcher() -> None:
+    global _MEILI_BATCHER
+    if _MEILI_BATCHER is not None:
+        _MEILI_BATCHER.stop()
+        _MEILI_BATCHER = None
+
+
+def index_product(product_id_uuid: str) -> None:
+    """
+    Worker entrypoint (queueing.enqueue_index_product).
+    Товар есть — upsert документа в Meili, товара нет — удаляем документ.
+    С включённым MeiliBatcher документ уходит в общую пачку.
+    """
+    http = _meili_http()
+    if http is None:
+        logger.info("[meili] index skipped (not configured) product_id_uuid=%s", product_id_uuid)
+        return
+
+    with SessionLocal() as db:
+        # один SELECT и только колонки документа
+        row = db.execute(
+            select(*_PRODUCT_DOC_COLS).where(Product.id_uuid == UUID(product_id_uuid))
+        ).one_or_none()
+        doc = _product_doc(row) if row is not None else None
+
+    if _MEILI_BATCHER is not None:
+        _MEILI_BATCHER.submit(product_id_uuid, doc)
+        return
+
+    _, _, index_name = _meili_cfg()
+
+    if doc is None:
+        _meili_delete_documents_raw(http, index_name, [product_id_uuid])
+        logger.info("[meili] delete product_id_uuid=%s", product_id_uuid)
+        return
+
+    _meili_add_documents_raw(http, index_name, [doc])
+    logger.info("[meili] index product_id_uuid=%s", product_id_uuid)
 
 
 # =============================================================================
@@ -125,50 +454,79 @@ def process_ai_job(job_id: str) -> None:
     Worker entrypoint.
     Полный цикл:
     AIJob → AI → Product(DRAFT) → link → DONE
+
+    Переходы AIJob — одним UPDATE (… RETURNING), без SELECT + mutate.
+    synchronize_session=False: AIJob в сессию не загружаем, синхронизировать
+    identity map нечего (иначе 'auto' → 'fetch' тянет лишний RETURNING).
     """
     t0 = time.perf_counter()
 
     # ------------------------------------------------------------------
-    # 1️⃣ LOAD JOB + MEDIA
+    # 1️⃣ CLAIM JOB + LOAD MEDIA (короткая транзакция)
     # ------------------------------------------------------------------
     with SessionLocal() as db:
-        job = db.query(AIJob).filter(AIJob.id == job_id).first()
-        if not job:
-            logger.warning("ai_job not found job_id=%s", job_id)
-            return
-
-        job.status = AIJobState.PROCESSING
-        job.updated_at = datetime.utcnow()
-        change_state(db, job, "ai_job", "start_processing", "system")
-
-        media = db.query(Media).filter(Media.id == job.media_id).first()
-        if not media:
-            job.status = AIJobState.FAILED
-            job.error = "media not found"
-            db.commit()
+        now = _now_db()
+        # UPDATE ai_jobs … FROM media … RETURNING: claim + данные media
+        # за один round-trip. Берём только QUEUED: повторная / устаревшая
+        # доставка не перезапускает уже взятый, готовый или упавший job.
+        # Строку блокирует сам UPDATE: повторная доставка того же job'а
+        # ждёт коммита и уже не проходит фильтр по status — SELECT … FOR UPDATE не нужен.
+        row = db.execute(
+            update(AIJob)
+            .where(
+                AIJob.id == job_id,
+                AIJob.status == AIJobState.QUEUED,
+                Media.id == AIJob.media_id,
+            )
+            .values(status=AIJobState.PROCESSING, updated_at=now)
+            .returning(AIJob.owner_id, AIJob.hint, Media.bucket, Media.object_key)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if row is None:
+            # job есть и ещё QUEUED, но media не нашлось — FAILED, как и раньше,
+            # а не вечный QUEUED
+            res = db.execute(
+                update(AIJob)
+                .where(AIJob.id == job_id, AIJob.status == AIJobState.QUEUED)
+                .values(status=AIJobState.FAILED, error="media not found", updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            if res.rowcount:
+                db.commit()
+                logger.warning("media not found job_id=%s", job_id)
+            else:
+                logger.warning("ai_job not found or not claimable job_id=%s", job_id)
             return
 
+        owner_id, hint, bucket, object_key = row
+        record_event(db, "ai_job", job_id, "start_processing", "system", now)
         db.commit()
 
     # ------------------------------------------------------------------
     # 2️⃣ CALL AI SERVICE
+    # Строго ВНЕ SessionLocal(): соединение из пула не держим
+    # все 5–120 с ожидания AI.
     # ------------------------------------------------------------------
     try:
-        resp = requests.post(
-            f"{os.getenv('AI_INTERNAL_URL', 'http://ai:8002')}/v1/analyze",
-            json={"bucket": media.bucket, "object_key": media.object_key},
-            timeout=(5, 120),
+        # orjson (C) вместо stdlib json — и на запрос, и на ответ
+        resp = _AI_CLIENT.post(
+            "/v1/analyze",
+            content=orjson.dumps({"bucket": bucket, "object_key": object_key, "hint": hint or None}),
+            headers={"Content-Type": "application/json"},
         )
         resp.raise_for_status()
-        result = resp.json() or {}
+        result = orjson.loads(resp.content) or {}
     except Exception as e:
         with SessionLocal() as db:
-            job = db.query(AIJob).filter(AIJob.id == job_id).first()
-            if job:
-                job.status = AIJobState.FAILED
-                job.error = str(e)
-                job.updated_at = datetime.utcnow()
-                change_state(db, job, "ai_job", "ai_failed", "system")
+            now = _now_db()
+            res = db.execute(
+                update(AIJob)
+                .where(AIJob.id == job_id, AIJob.status == AIJobState.PROCESSING)
+                .values(status=AIJobState.FAILED, error=str(e), updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            if res.rowcount:
+                record_event(db, "ai_job", job_id, "ai_failed", "system", now)
                 db.commit()
         logger.exception("AI request failed job_id=%s", job_id)
         return
@@ -177,37 +535,54 @@ def process_ai_job(job_id: str) -> None:
     # 3️⃣ CREATE PRODUCT (UUID PK)
     # ------------------------------------------------------------------
     with SessionLocal() as db:
-        job = db.query(AIJob).filter(AIJob.id == job_id).first()
-
-        product = Product(
-            owner_id=job.owner_id,
-            status=ProductState.DRAFT_EMPTY.value,
-            title="Товар (черновик)",
-            attributes={},
-            tags=[],
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow(),
+        now = _now_db()  # один timestamp на product + job
+
+        # Все поля считаем заранее и пишем Core INSERT'ом: без unit-of-work,
+        # identity map и flush(). Он же уходит раньше UPDATE ai_jobs (FK draft_product_id_uuid).
+        # один UUIDv7 на оба ключа: legacy id (NOT NULL, без default) —
+        # строковая форма того же id_uuid
+        product_uuid = uuid7()
+        values = {
+            "id_uuid": product_uuid,
+            "id": str(product_uuid),
+            "owner_id": owner_id,
+            "status": ProductState.DRAFT_EMPTY.value,
+            "title": "Товар (черновик)",
+            "attributes": result.get("attributes") or {},
+            "tags": result.get("tags") or [],
+            "created_at": now,
+            "updated_at": now,
+        }
+        _update_product_text(values, result)
+        db.execute(insert(Product).values(values))
+
+        res = db.execute(
+            update(AIJob)
+            .where(AIJob.id == job_id, AIJob.status == AIJobState.PROCESSING)
+            .values(
+                status=AIJobState.DONE,
+                draft_product_id_uuid=product_uuid,
+                result_json=result,
+                updated_at=now,
+            )
+            .execution_options(synchronize_session=False)
         )
-        db.add(product)
-        db.flush()  # ⬅️ id_uuid доступен
-
-        _update_product_text(product, result)
-        product.attributes = result.get("attributes") or {}
-        product.tags = result.get("tags") or []
-
-        job.status = AIJobState.DONE
-        job.draft_product_id_uuid = product.id_uuid
-        job.result = result
-        job.updated_at = datetime.utcnow()
+        if res.rowcount == 0:
+            # job удалён (CASCADE от media) или перехвачен, пока ждали AI —
+            # откатываем и INSERT product, сироту не оставляем
+            db.rollback()
+            logger.warning("ai_job gone before done job_id=%s", job_id)
+            return
 
-        change_state(db, job, "ai_job", "ai_done", "system")
-        change_state(db, product, "product", "ready_for_publish", "system")
+        # товар создаётся в DRAFT_EMPTY (начальное состояние FSM) — перехода
+        # нет, событие пишется только по ai_job
+        record_event(db, "ai_job", job_id, "ai_done", "system", now)
 
         db.commit()
 
     logger.info(
         "[ai] job done job_id=%s product_id_uuid=%s ms=%s",
         job_id,
-        product.id_uuid,
+        product_uuid,
         int((time.perf_counter() - t0) * 1000),
-    )
\ No newline at end of file
+    )
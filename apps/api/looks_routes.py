@@ -1,15 +1,17 @@
-import uuid
-from datetime import datetime
+import base64
+from datetime import datetime, timezone
 from typing import Optional
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import and_, bindparam, delete, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from db import get_db
+from db import get_async_db
 from auth import get_current_user
-from models import User, Look, LookItem, Product, ProductMedia
+from models import User, Look, LookItem, Product, product_media_json, uuid7
 
 router = APIRouter(prefix="/v1", tags=["looks"])
 
@@ -34,8 +36,101 @@ class AddLookItemReq(BaseModel):
     product_id_uuid: UUID
 
 
+class LookOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    title: str | None = None
+    occasion: str | None = None
+    season: str | None = None
+    # в схеме looks обе колонки nullable — None не должен ронять ответ в 500
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class LookListOut(BaseModel):
+    items: list[LookOut]
+    limit: int
+    next_cursor: str | None = None
+    has_more: bool
+    total: int | None = None
+
+
+def _norm(value: str | None) -> str | None:
+    # None — сразу None, без промежуточной "" и лишнего strip
+    return (value.strip() or None) if value else None
+
+
 def _now() -> datetime:
-    return datetime.utcnow()
+    # колонки DateTime — naive UTC (asyncpg не примет aware datetime для них);
+    # вызывается один раз на запрос
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# ============================================================
+# STATEMENTS
+# Горячие выражения собираем один раз при импорте: на запрос —
+# только bind-параметры, без построения выражения заново
+# (скомпилированный SQL берётся из кеша по тому же объекту).
+# ============================================================
+
+_OWNED_LOOK = select(Look).where(
+    Look.id == bindparam("lid"),
+    Look.owner_id == bindparam("uid"),
+)
+
+# обе проверки владельца — одним запросом:
+# нет строки — нет образа, NULL справа — нет (своего) товара
+_OWNED_LOOK_WITH_PRODUCT = (
+    select(Look, Product.id_uuid)
+    .outerjoin(
+        Product,
+        and_(
+            Product.id_uuid == bindparam("pid"),
+            Product.owner_id == bindparam("uid"),
+        ),
+    )
+    .where(Look.id == bindparam("lid"), Look.owner_id == bindparam("uid"))
+)
+
+_LOOK_ITEM_ID = select(LookItem.id).where(
+    LookItem.look_id == bindparam("lid"),
+    LookItem.product_id_uuid == bindparam("pid"),
+)
+
+# media товара — тем же запросом (общий json_agg из models, как документ
+# Meili в jobs.py), url собирает Postgres; без товаров-media — []
+_PRODUCT_MEDIA_JSON = product_media_json()
+
+# товары образа вместе с media — один round trip: порядок — по строкам
+# связи, чужие товары отсекает условие владельца прямо в ON (Postgres, а не Python)
+_LOOK_PRODUCTS = (
+    select(
+        Product.id_uuid,
+        Product.status,
+        Product.title,
+        Product.category_id,
+        Product.tags,
+        Product.updated_at,
+        _PRODUCT_MEDIA_JSON.label("media"),
+    )
+    .join(
+        LookItem,
+        and_(
+            LookItem.product_id_uuid == Product.id_uuid,
+            LookItem.look_id == bindparam("lid"),
+            Product.owner_id == bindparam("uid"),
+        ),
+    )
+    .order_by(LookItem.created_at)
+)
+
+
+async def _get_owned_look(db: AsyncSession, look_id: UUID, owner_id) -> Look:
+    lk = await db.scalar(_OWNED_LOOK, {"lid": look_id, "uid": owner_id})
+    if not lk:
+        raise HTTPException(status_code=404, detail="look not found")
+    return lk
 
 
 # ============================================================
@@ -43,195 +138,169 @@ def _now() -> datetime:
 # ============================================================
 
 @router.post("/looks", operation_id="create_look")
-def create_look(
+async def create_look(
     payload: LookCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current: User = Depends(get_current_user),
 ):
     now = _now()
 
     lk = Look(
-        id=str(uuid.uuid4()),
+        id=uuid7(),
         owner_id=current.id,
-        title=(payload.title or "").strip() or None,
-        occasion=(payload.occasion or "").strip() or None,
-        season=(payload.season or "").strip() or None,
+        title=_norm(payload.title),
+        occasion=_norm(payload.occasion),
+        season=_norm(payload.season),
         created_at=now,
         updated_at=now,
     )
 
     db.add(lk)
-    db.commit()
+    await db.commit()
 
     return {"id": lk.id}
 
 
-@router.get("/looks", operation_id="list_looks")
-def list_looks(
-    db: Session = Depends(get_db),
+def _encode_cursor(updated_at: datetime, look_id: UUID) -> str:
+    raw = f"{updated_at.isoformat()}|{look_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        ts, look_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(ts), UUID(look_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+@router.get("/looks", operation_id="list_looks", response_model=LookListOut)
+async def list_looks(
+    db: AsyncSession = Depends(get_async_db),
     current: User = Depends(get_current_user),
     limit: int = Query(20, ge=1, le=100),
-    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None),
+    include_total: bool = Query(False),
 ):
-    q = db.query(Look).filter(Look.owner_id == current.id)
+    """
+    Keyset-пагинация: cursor = (updated_at, id) последнего элемента страницы.
+    Index seek по ix_looks_owner_updated_id_incl вместо OFFSET (скан и выброс
+    всех пропущенных строк) — цена страницы не растёт с глубиной.
+
+    has_more — по limit + 1 строке; COUNT(*) только по include_total=true.
+    """
+    total = None
+    if include_total:
+        total = await db.scalar(
+            select(func.count()).select_from(Look).where(Look.owner_id == current.id)
+        )
 
-    total = q.count()
+    q = select(Look).where(Look.owner_id == current.id)
 
-    q = q.order_by(
-        Look.updated_at.desc().nullslast(),
-        Look.created_at.desc().nullslast(),
-    )
+    if cursor:
+        ts, last_id = _decode_cursor(cursor)
+        q = q.where(tuple_(Look.updated_at, Look.id) < tuple_(ts, last_id))
+
+    q = q.order_by(Look.updated_at.desc(), Look.id.desc()).limit(limit + 1)
 
-    looks = q.limit(limit).offset(offset).all()
+    looks = (await db.scalars(q)).all()
+    has_more = len(looks) > limit
+    looks = looks[:limit]
 
+    next_cursor = _encode_cursor(looks[-1].updated_at, looks[-1].id) if has_more else None
+
+    # ORM-строки как есть: LookOut читает атрибуты (from_attributes)
     return {
-        "items": [
-            {
-                "id": l.id,
-                "title": l.title,
-                "occasion": l.occasion,
-                "season": l.season,
-                "created_at": l.created_at.isoformat(),
-                "updated_at": l.updated_at.isoformat(),
-            }
-            for l in looks
-        ],
+        "items": looks,
         "limit": limit,
-        "offset": offset,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
         "total": total,
     }
 
 
+def _look_item_out(p) -> dict:
+    return {
+        "product_id_uuid": str(p["id_uuid"]),
+        "status": p["status"],
+        "title": p["title"],
+        "category_id": p["category_id"],
+        "tags": p["tags"] or [],
+        "updated_at": p["updated_at"],
+        "media": p["media"],
+    }
+
+
 @router.get("/looks/{look_id}", operation_id="get_look")
-def get_look(
-    look_id: str,
-    db: Session = Depends(get_db),
+async def get_look(
+    look_id: UUID,
+    db: AsyncSession = Depends(get_async_db),
     current: User = Depends(get_current_user),
 ):
-    lk = (
-        db.query(Look)
-        .filter(Look.id == look_id, Look.owner_id == current.id)
-        .first()
-    )
-    if not lk:
-        raise HTTPException(status_code=404, detail="look not found")
-
-    link_rows = (
-        db.query(LookItem)
-        .filter(LookItem.look_id == lk.id)
-        .all()
-    )
+    lk = await _get_owned_look(db, look_id, current.id)
 
-    product_uuids = [li.product_id_uuid for li in link_rows]
+    # Товары с media — Core-строки (mappings): читаются один раз в JSON,
+    # ORM-объекты и identity map тут не нужны
+    products = (
+        await db.execute(_LOOK_PRODUCTS, {"lid": lk.id, "uid": current.id})
+    ).mappings().all()
 
-    products: list[Product] = []
-    media_by_product: dict[UUID, list[ProductMedia]] = {}
-
-    if product_uuids:
-        products = (
-            db.query(Product)
-            .filter(
-                Product.id_uuid.in_(product_uuids),
-                Product.owner_id == current.id,
-            )
-            .all()
-        )
-
-        medias = (
-            db.query(ProductMedia)
-            .filter(ProductMedia.product_id_uuid.in_(product_uuids))
-            .all()
-        )
-
-        for m in medias:
-            media_by_product.setdefault(m.product_id_uuid, []).append(m)
-
-    prod_map = {p.id_uuid: p for p in products}
-
-    items = []
-    for pid in product_uuids:
-        p = prod_map.get(pid)
-        if not p:
-            continue
-
-        items.append(
-            {
-                "product_id_uuid": str(p.id_uuid),
-                "status": p.status,
-                "title": p.title,
-                "category_id": p.category_id,
-                "tags": p.tags or [],
-                "updated_at": p.updated_at.isoformat(),
-                "media": [
-                    {
-                        "id": m.id,
-                        "kind": m.kind,
-                        "url": f"/media/{m.bucket}/{m.object_key}",
-                    }
-                    for m in media_by_product.get(p.id_uuid, [])
-                ],
-            }
-        )
+    items = [_look_item_out(p) for p in products]
 
     return {
         "id": lk.id,
         "title": lk.title,
         "occasion": lk.occasion,
         "season": lk.season,
-        "created_at": lk.created_at.isoformat(),
-        "updated_at": lk.updated_at.isoformat(),
+        "created_at": lk.created_at,
+        "updated_at": lk.updated_at,
         "items": items,
     }
 
 
 @router.patch("/looks/{look_id}", operation_id="patch_look")
-def patch_look(
-    look_id: str,
+async def patch_look(
+    look_id: UUID,
     payload: LookPatch,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current: User = Depends(get_current_user),
 ):
-    lk = (
-        db.query(Look)
-        .filter(Look.id == look_id, Look.owner_id == current.id)
-        .first()
+    # только присланные поля; "" / пробелы — очистка поля (NULL)
+    changes = {
+        field: _norm(value)
+        for field, value in payload.model_dump(exclude_none=True).items()
+    }
+
+    # один UPDATE с проверкой владельца, без загрузки строки
+    res = await db.execute(
+        update(Look)
+        .where(Look.id == look_id, Look.owner_id == current.id)
+        .values(**changes, updated_at=_now())
+        .execution_options(synchronize_session=False)
     )
-    if not lk:
+    if res.rowcount == 0:
         raise HTTPException(status_code=404, detail="look not found")
 
-    if payload.title is not None:
-        lk.title = payload.title.strip() or None
-    if payload.occasion is not None:
-        lk.occasion = payload.occasion.strip() or None
-    if payload.season is not None:
-        lk.season = payload.season.strip() or None
-
-    lk.updated_at = _now()
-
-    db.commit()
+    await db.commit()
     return {"status": "ok"}
 
 
 @router.delete("/looks/{look_id}", operation_id="delete_look")
-def delete_look(
-    look_id: str,
-    db: Session = Depends(get_db),
+async def delete_look(
+    look_id: UUID,
+    db: AsyncSession = Depends(get_async_db),
     current: User = Depends(get_current_user),
 ):
-    lk = (
-        db.query(Look)
-        .filter(Look.id == look_id, Look.owner_id == current.id)
-        .first()
+    # look_items удаляет ON DELETE CASCADE (миграция d7a3c1e9b5f4)
+    res = await db.execute(
+        delete(Look)
+        .where(Look.id == look_id, Look.owner_id == current.id)
+        .execution_options(synchronize_session=False)
     )
-    if not lk:
+    if res.rowcount == 0:
         raise HTTPException(status_code=404, detail="look not found")
 
-    db.query(LookItem).filter(LookItem.look_id == lk.id).delete(
-        synchronize_session=False
-    )
-
-    db.delete(lk)
-    db.commit()
+    await db.commit()
     return {"status": "ok"}
 
 
@@ -240,85 +309,84 @@ def delete_look(
 # ============================================================
 
 @router.post("/looks/{look_id}/items", operation_id="add_look_item")
-def add_look_item(
-    look_id: str,
+async def add_look_item(
+    look_id: UUID,
     payload: AddLookItemReq,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current: User = Depends(get_current_user),
 ):
-    lk = (
-        db.query(Look)
-        .filter(Look.id == look_id, Look.owner_id == current.id)
-        .first()
-    )
-    if not lk:
+    row = (
+        await db.execute(
+            _OWNED_LOOK_WITH_PRODUCT,
+            {"lid": look_id, "uid": current.id, "pid": payload.product_id_uuid},
+        )
+    ).first()
+    if not row:
         raise HTTPException(status_code=404, detail="look not found")
 
-    product = (
-        db.query(Product)
-        .filter(
-            Product.id_uuid == payload.product_id_uuid,
-            Product.owner_id == current.id,
-        )
-        .first()
-    )
-    if not product:
+    lk, product_id_uuid = row
+    if product_id_uuid is None:
         raise HTTPException(status_code=404, detail="product not found")
 
-    existing = (
-        db.query(LookItem)
-        .filter(
-            LookItem.look_id == lk.id,
-            LookItem.product_id_uuid == product.id_uuid,
+    now = _now()
+
+    # атомарно: без пробы на существование и без гонки двух одинаковых запросов
+    li_id = (await db.execute(
+        pg_insert(LookItem)
+        .values(
+            id=uuid7(),
+            look_id=lk.id,
+            product_id_uuid=product_id_uuid,
+            created_at=now,
         )
-        .first()
-    )
-    if existing:
-        return {"status": "ok", "id": existing.id}
-
-    li = LookItem(
-        id=str(uuid.uuid4()),
-        look_id=lk.id,
-        product_id_uuid=product.id_uuid,
-        created_at=_now(),
-    )
+        .on_conflict_do_nothing(constraint="uq_look_items_look_product_uuid")
+        .returning(LookItem.id)
+    )).scalar_one_or_none()
 
-    db.add(li)
-    lk.updated_at = _now()
+    if li_id is None:
+        # уже в образе — отдаём существующую связь (редкий путь)
+        existing_id = await db.scalar(_LOOK_ITEM_ID, {"lid": lk.id, "pid": product_id_uuid})
+        await db.rollback()
+        return {"status": "ok", "id": existing_id}
 
-    db.commit()
-    return {"status": "ok", "id": li.id}
+    lk.updated_at = now
+
+    await db.commit()
+    return {"status": "ok", "id": li_id}
 
 
 @router.delete(
     "/looks/{look_id}/items/{product_id_uuid}",
     operation_id="remove_look_item",
 )
-def remove_look_item(
-    look_id: str,
+async def remove_look_item(
+    look_id: UUID,
     product_id_uuid: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current: User = Depends(get_current_user),
 ):
-    lk = (
-        db.query(Look)
-        .filter(Look.id == look_id, Look.owner_id == current.id)
-        .first()
-    )
-    if not lk:
-        raise HTTPException(status_code=404, detail="look not found")
+    # владелец проверяется в самом DELETE (подзапрос по looks)
+    owned_look = select(Look.id).where(Look.id == look_id, Look.owner_id == current.id)
 
-    deleted = (
-        db.query(LookItem)
-        .filter(
-            LookItem.look_id == lk.id,
+    res = await db.execute(
+        delete(LookItem)
+        .where(
+            LookItem.look_id.in_(owned_look.scalar_subquery()),
             LookItem.product_id_uuid == product_id_uuid,
         )
-        .delete(synchronize_session=False)
+        .execution_options(synchronize_session=False)
     )
 
-    if deleted:
-        lk.updated_at = _now()
+    if res.rowcount:
+        await db.execute(
+            update(Look)
+            .where(Look.id == look_id)
+            .values(updated_at=_now())
+            .execution_options(synchronize_session=False)
+        )
+    elif await db.scalar(owned_look) is None:
+        # удалять было нечего — отличаем «нет образа» от «нет товара в образе»
+        raise HTTPException(status_code=404, detail="look not found")
 
-    db.commit()
+    await db.commit()
     return {"status": "ok"}
\ No newline at end of file
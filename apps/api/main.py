@@ -1,48 +1,194 @@
 # main.py — SINGLE SOURCE OF TRUTH
 
 import os
-import uuid
 import time
+import asyncio
+import hashlib
 import logging
-from datetime import datetime
+import functools
+from contextlib import asynccontextmanager
 from typing import Any
 
-from fastapi import FastAPI, HTTPException, Depends, Request
+import anyio
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert, select, text
 from sqlalchemy.exc import OperationalError, ProgrammingError
 from pydantic import BaseModel
+from alembic.config import Config as AlembicConfig
+from alembic.script import ScriptDirectory
 
-from db import get_db, SessionLocal
+from db import get_async_db, SessionLocal
 from storage import ensure_bucket
 from models import Category, Media, AIJob, User
 from queueing import enqueue_process_job
 
 # routers
-from auth import router as auth_router, get_current_user
+from auth import router as auth_router, get_current_user, shutdown_bcrypt_pool
 from search_routes import router as catalog_router
 from media_routes import router as media_router
+from looks_routes import router as looks_router
 
 logger = logging.getLogger(__name__)
 
 API_VERSION = os.getenv("API_VERSION", "1").strip() or "1"
 
+# ---------------------------------------------------------------------
+# CORS
+# ---------------------------------------------------------------------
+
+def _parse_cors_origins() -> frozenset[str]:
+    """CORS_ORIGINS — через запятую; по умолчанию "*" (любой origin)."""
+    raw = os.getenv("CORS_ORIGINS", "*")
+    return frozenset(o.strip() for o in raw.split(",") if o.strip())
+
+
+class _SetCORSMiddleware(CORSMiddleware):
+    """
+    CORSMiddleware с проверкой origin по frozenset: Starlette ищет его
+    в списке allow_origins на каждом запросе (O(n) от числа origin'ов).
+    """
+
+    def __init__(self, app, allow_origins=(), **kwargs):
+        super().__init__(app, allow_origins=allow_origins, **kwargs)
+        self._origin_set = frozenset(allow_origins)
+
+    def is_allowed_origin(self, origin: str) -> bool:
+        if self.allow_all_origins:
+            return True
+        if self.allow_origin_regex is not None and self.allow_origin_regex.fullmatch(origin):
+            return True
+        return origin in self._origin_set
+
+
+# разбирается один раз при импорте
+CORS_ORIGINS = _parse_cors_origins()
+
+# ---------------------------------------------------------------------
+# STARTUP
+# ---------------------------------------------------------------------
+
+# sync-роуты (media, wear-log) идут в threadpool AnyIO — по умолчанию
+# 40 потоков; больше — чтобы медленный MinIO/БД не выстраивал очередь
+API_THREADPOOL_SIZE = int(os.getenv("API_THREADPOOL_SIZE", "100"))
+
+
+def seed_categories(db: Session) -> None:
+    roots = [
+        ("odezhda", "Одежда"),
+        ("obuv", "Обувь"),
+        ("aksessuary", "Аксессуары"),
+    ]
+
+    subs = [
+        ("odezhda", "women", "Женщинам"),
+        ("odezhda", "men", "Мужчинам"),
+        ("odezhda", "futbolki", "Футболки"),
+        ("obuv", "krossovki", "Кроссовки"),
+        ("aksessuary", "sumki", "Сумки"),
+    ]
+
+    def row(path: str, name: str, slug: str, parent_id: str | None) -> dict:
+        return {
+            "parent_id": parent_id,
+            "name": name,
+            "slug": slug,
+            "path": path,
+            "is_active": True,
+            "sort_order": 0,
+            "ai_aliases": {},
+        }
+
+    # startup идёт в каждом uvicorn-воркере: сидируем под transaction-level
+    # advisory lock (снимается на commit), иначе воркеры продублируют корни
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext('seed_categories'))"))
+
+    # что уже есть — одним SELECT, дальше по уровню один multi-row INSERT
+    # (id генерирует Postgres, корни возвращают свои id через RETURNING)
+    paths = [slug for slug, _ in roots] + [f"{root}/{slug}" for root, slug, _ in subs]
+    existing = dict(
+        db.execute(select(Category.path, Category.id).where(Category.path.in_(paths))).all()
+    )
+
+    new_roots = [row(slug, name, slug, None) for slug, name in roots if slug not in existing]
+    if new_roots:
+        existing.update(
+            db.execute(insert(Category).returning(Category.path, Category.id), new_roots).all()
+        )
+
+    new_subs = [
+        row(f"{root}/{slug}", name, slug, existing[root])
+        for root, slug, name in subs
+        if f"{root}/{slug}" not in existing
+    ]
+    if new_subs:
+        db.execute(insert(Category), new_subs)
+
+    db.commit()
+    invalidate_categories_cache()
+
+
+def _maybe_seed() -> None:
+    with SessionLocal() as db:
+        # seed_categories добавляет только недостающие категории, поэтому
+        # запускается всегда; до него — лишь проверка, что миграции уже создали таблицу
+        try:
+            table_ready = db.scalar(text("SELECT to_regclass('categories') IS NOT NULL"))
+        except (OperationalError, ProgrammingError):
+            table_ready = False
+        if not table_ready:
+            logger.warning("Categories table not ready — skip seeding")
+            return
+        seed_categories(db)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
+
+    # MinIO и БД — блокирующие клиенты: в threadpool, event loop не держим
+    try:
+        await anyio.to_thread.run_sync(ensure_bucket)
+    except Exception as e:
+        logger.warning("MinIO not ready: %s", e)
+
+    try:
+        await anyio.to_thread.run_sync(_maybe_seed)
+    except Exception as e:
+        logger.warning("Seed failed (ignored): %s", e)
+
+    yield
+
+    # дожидаемся bcrypt-процессов вне event loop
+    await anyio.to_thread.run_sync(shutdown_bcrypt_pool)
+
+
 # ---------------------------------------------------------------------
 # APP
 # ---------------------------------------------------------------------
 
-app = FastAPI(title="Clothing API", version="0.1.0")
+# orjson (C) сериализует ответы, включая datetime/UUID, без stdlib json
+app = FastAPI(
+    title="Clothing API",
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 app.add_middleware(ProxyHeadersMiddleware, trusted_hosts="*")
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
+    _SetCORSMiddleware,
+    allow_origins=["*"] if "*" in CORS_ORIGINS else sorted(CORS_ORIGINS),
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# JSON < 1 KB сжимать нет смысла; level 5 — баланс CPU / размер
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
 
 # ---------------------------------------------------------------------
 # ROUTERS (ЕДИНСТВЕННОЕ МЕСТО ПОДКЛЮЧЕНИЯ)
@@ -51,6 +197,7 @@ app.add_middleware(
 app.include_router(auth_router)
 app.include_router(catalog_router)
 app.include_router(media_router)  # ← ВАЖНО: /v1/media/upload
+app.include_router(looks_router)
 
 # ---------------------------------------------------------------------
 # ERROR HANDLING
@@ -58,7 +205,7 @@ app.include_router(media_router)  # ← ВАЖНО: /v1/media/upload
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"error": "http_error", "detail": exc.detail},
         headers={"API-Version": API_VERSION},
@@ -68,7 +215,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 @app.exception_handler(Exception)
 async def unhandled_exception_handler(request: Request, exc: Exception):
     logger.exception("Unhandled error")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={"error": "internal_error"},
         headers={"API-Version": API_VERSION},
@@ -87,75 +234,105 @@ async def add_headers_and_timing(request: Request, call_next):
 
 
 # ---------------------------------------------------------------------
-# STARTUP
+# HEALTH
 # ---------------------------------------------------------------------
 
-@app.on_event("startup")
-def startup():
-    try:
-        ensure_bucket()
-    except Exception as e:
-        logger.warning("MinIO not ready: %s", e)
-
-    try:
-        with SessionLocal() as db:
-            try:
-                db.execute(text("SELECT 1 FROM categories LIMIT 1"))
-            except (OperationalError, ProgrammingError):
-                logger.warning("Categories table not ready — skip seeding")
-                return
-            seed_categories(db)
-    except Exception as e:
-        logger.warning("Seed failed (ignored): %s", e)
+@app.get("/health")
+def health():
+    return {"status": "ok"}
 
 
-def seed_categories(db: Session) -> None:
-    def get_or_create(path: str, name: str, slug: str, parent_id: str | None):
-        c = db.query(Category).filter(Category.path == path).first()
-        if c:
-            return c
-        c = Category(
-            id=str(uuid.uuid4()),
-            parent_id=parent_id,
-            name=name,
-            slug=slug,
-            path=path,
-            is_active=True,
-            sort_order=0,
-            ai_aliases={},
-        )
-        db.add(c)
-        db.flush()
-        return c
+@functools.lru_cache(maxsize=1)
+def _alembic_heads() -> tuple[str, ...]:
+    here = os.path.dirname(os.path.abspath(__file__))
+    cfg = AlembicConfig(os.path.join(here, "alembic.ini"))
+    cfg.set_main_option("script_location", os.path.join(here, "alembic"))
+    return tuple(ScriptDirectory.from_config(cfg).get_heads())
 
-    roots = {
-        "odezhda": get_or_create("odezhda", "Одежда", "odezhda", None),
-        "obuv": get_or_create("obuv", "Обувь", "obuv", None),
-        "aksessuary": get_or_create("aksessuary", "Аксессуары", "aksessuary", None),
-    }
 
-    subs = [
-        ("odezhda", "women", "Женщинам"),
-        ("odezhda", "men", "Мужчинам"),
-        ("odezhda", "futbolki", "Футболки"),
-        ("obuv", "krossovki", "Кроссовки"),
-        ("aksessuary", "sumki", "Сумки"),
-    ]
-
-    for root, slug, name in subs:
-        parent = roots[root]
-        get_or_create(f"{parent.path}/{slug}", name, slug, parent.id)
+@app.get("/healthz/migrations")
+async def healthz_migrations(db: AsyncSession = Depends(get_async_db)):
+    """
+    Миграции накатывает сервис migrate (не startup API).
+    200 — схема на head, 503 — миграции ещё не применены.
+    """
+    heads = sorted(_alembic_heads())
+    try:
+        current = sorted(
+            await db.scalars(text("SELECT version_num FROM alembic_version"))
+        )
+    except (OperationalError, ProgrammingError):
+        current = []
 
-    db.commit()
+    ok = current == heads
+    return ORJSONResponse(
+        status_code=200 if ok else 503,
+        content={"status": "ok" if ok else "pending", "current": current, "head": heads},
+    )
 
 
 # ---------------------------------------------------------------------
-# HEALTH
+# CATEGORIES
 # ---------------------------------------------------------------------
 
-@app.get("/health")
-def health():
-    return {"status": "ok"}
+CATEGORIES_CACHE_TTL = int(os.getenv("CATEGORIES_CACHE_TTL", "60"))  # сек
+
+# (expires_at, version, etag, body): дерево меняется только при seed/админке —
+# на запрос отдаём готовые байты, в БД ходим раз в TTL на процесс
+_CAT_CACHE: tuple[float, int, str, bytes] | None = None
+_CAT_VERSION = 0
+_CAT_LOCK = asyncio.Lock()
+
+# дерево целиком собирает Postgres (функция categories_tree_json, миграция
+# d3f8b6a2e4c9): приходит готовая JSON-строка — ни строк на узел, ни сборки в Python
+_CATEGORIES_SQL = text("SELECT json_build_object('items', categories_tree_json(NULL))::text")
+
+
+def invalidate_categories_cache() -> None:
+    """Вызывать после любого изменения categories (seed, админка)."""
+    global _CAT_VERSION
+    _CAT_VERSION += 1
+
+
+async def _categories_tree_cached(db: AsyncSession) -> tuple[str, bytes]:
+    global _CAT_CACHE
+    cached = _CAT_CACHE
+    if cached and cached[0] > time.monotonic() and cached[1] == _CAT_VERSION:
+        return cached[2], cached[3]
+
+    async with _CAT_LOCK:
+        # пока ждали lock, кеш мог обновить соседний запрос
+        cached = _CAT_CACHE
+        if cached and cached[0] > time.monotonic() and cached[1] == _CAT_VERSION:
+            return cached[2], cached[3]
+
+        version = _CAT_VERSION
+        body = (await db.scalar(_CATEGORIES_SQL)).encode()
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        _CAT_CACHE = (time.monotonic() + CATEGORIES_CACHE_TTL, version, etag, body)
+        return etag, body
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match по RFC 9110: `*` или список тегов, сравнение слабое (без W/)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # gzip на прокси (nginx) ослабляет ETag до W/"…" — клиент пришлёт уже его
+    return any(
+        tag.strip().removeprefix("W/") == etag
+        for tag in if_none_match.split(",")
+    )
+
+
+@app.get("/v1/categories/tree", operation_id="categories_tree")
+async def categories_tree(request: Request, db: AsyncSession = Depends(get_async_db)):
+    etag, body = await _categories_tree_cached(db)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={CATEGORIES_CACHE_TTL}"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 # ---------------------------------------------------------------------
@@ -167,30 +344,40 @@ class CreateJobReq(BaseModel):
     hint: dict[str, Any] | None = None
 
 
-@app.post("/v1/ai/jobs")
-def create_ai_job(
+class CreateJobResp(BaseModel):
+    job_id: str
+    status: str
+
+
+@app.post("/v1/ai/jobs", response_model=CreateJobResp)
+async def create_ai_job(
     payload: CreateJobReq,
-    db: Session = Depends(get_db),
+    background: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
     current: User = Depends(get_current_user),
 ):
-    media = db.query(Media).filter(Media.id == payload.media_id).first()
-    if not media or media.owner_id != current.id:
+    # владелец проверяется в WHERE: чужой media неотличим от отсутствующего
+    media_id = await db.scalar(
+        select(Media.id).where(Media.id == payload.media_id, Media.owner_id == current.id)
+    )
+    if not media_id:
         raise HTTPException(status_code=404, detail="media not found")
 
-    job_id = str(uuid.uuid4())
-    now = datetime.utcnow()
-
+    # id и created_at/updated_at — server_default: Postgres заполняет их
+    # в INSERT, id приходит обратно через RETURNING на flush
     job = AIJob(
-        id=job_id,
         owner_id=current.id,
-        media_id=media.id,
+        media_id=media_id,
         status="queued",
         hint=payload.hint or {},
-        created_at=now,
-        updated_at=now,
     )
     db.add(job)
-    db.commit()
-
-    enqueue_process_job(job_id)
+    await db.flush()
+    job_id = job.id
+    await db.commit()
+
+    # enqueue — после отправки ответа (sync-задача уходит в threadpool):
+    # RTT до Redis не входит в latency запроса. Строка job уже закоммичена
+    # в статусе queued — при сбое enqueue её можно переотправить.
+    background.add_task(enqueue_process_job, job_id)
     return {"job_id": job_id, "status": "queued"}
\ No newline at end of file
@@ -1,21 +1,34 @@
 from __future__ import annotations
 
 import os
-import io
-import uuid
-from datetime import datetime, timedelta
+import hashlib
+import functools
+from datetime import timedelta
 
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Response
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from minio import Minio
+from minio.error import S3Error
 
 from db import SessionLocal
-from models import Media
+from models import Media, uuid7_str
 from auth import get_current_user
 
 
 router = APIRouter(prefix="/v1/media", tags=["media"])
 
+# multipart-части MinIO: файл уходит кусками, а не целиком из памяти
+UPLOAD_PART_SIZE = int(os.getenv("MINIO_PART_SIZE", str(10 * 1024 * 1024)))
+
+# допустимые MIME загрузки → расширение object key: точное совпадение
+# (одна dict-выборка), image/svg+xml и прочее не проходят
+_MIME_TO_EXT = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp"}
+
+# первых байт хватает, чтобы узнать формат по сигнатуре
+_SNIFF_BYTES = 12
+
 
 # -----------------------------------------------------------------------------
 # helpers
@@ -29,12 +42,80 @@ def get_db():
         db.close()
 
 
+_ENSURED_BUCKETS: set[str] = set()
+
+
+def _ensure_bucket(minio: Minio, bucket: str) -> None:
+    # bucket_exists — round trip к MinIO; проверяем один раз на процесс
+    if bucket in _ENSURED_BUCKETS:
+        return
+    if not minio.bucket_exists(bucket):
+        minio.make_bucket(bucket)
+    _ENSURED_BUCKETS.add(bucket)
+
+
+def _upload_size(file: UploadFile) -> int:
+    # size выставляет парсер multipart; иначе — по позиции в spooled-файле
+    if file.size is not None:
+        return file.size
+    f = file.file
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    return size
+
+
+def _sniff_image_type(head: bytes) -> str | None:
+    """MIME по сигнатуре файла (jpeg / png / webp), иначе None."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def _get_owned_media(db: Session, media_id: str, owner_id) -> Media:
+    # владелец — в WHERE (lookup по PK): чужая запись не грузится вовсе
+    # и неотличима от отсутствующей
+    media = (
+        db.query(Media)
+        .filter(Media.id == media_id, Media.owner_id == owner_id)
+        .first()
+    )
+    if not media:
+        raise HTTPException(status_code=404, detail="media not found")
+    return media
+
+
+def _strip_scheme(url: str) -> str:
+    return url.replace("http://", "").replace("https://", "")
+
+
+@functools.lru_cache(maxsize=1)
+def _public_hosts() -> tuple[str, str] | None:
+    """
+    (внутренний, публичный) host MinIO для подмены в presigned URL —
+    env читается и разбирается один раз на процесс, а не на каждый download.
+    """
+    public_minio = os.getenv("MINIO_PUBLIC_ENDPOINT")
+    if not public_minio:
+        return None
+    return _strip_scheme(os.getenv("MINIO_ENDPOINT") or ""), _strip_scheme(public_minio)
+
+
+@functools.lru_cache(maxsize=1)
 def get_minio() -> Minio:
+    """
+    Клиент на процесс (потокобезопасен): его urllib3-пул держит
+    keep-alive соединения к MinIO, а не открывает новые на каждый запрос.
+    """
     endpoint = os.getenv("MINIO_ENDPOINT")
     if not endpoint:
         raise RuntimeError("MINIO_ENDPOINT is not set")
 
-    endpoint = endpoint.replace("http://", "").replace("https://", "")
+    endpoint = _strip_scheme(endpoint)
 
     return Minio(
         endpoint,
@@ -48,57 +129,255 @@ def get_minio() -> Minio:
 # UPLOAD
 # -----------------------------------------------------------------------------
 
-@router.post("/upload")
+class UploadResp(BaseModel):
+    media_id: str
+    bucket: str
+    object_key: str
+    size_bytes: int
+
+
+def _upload_resp(media: Media) -> dict:
+    return {
+        "media_id": media.id,
+        "bucket": media.bucket,
+        "object_key": media.object_key,
+        "size_bytes": media.size_bytes,
+    }
+
+
+def _find_by_checksum(db: Session, owner_id, checksum: str) -> Media | None:
+    return (
+        db.query(Media)
+        .filter(Media.owner_id == owner_id, Media.checksum_sha256 == checksum)
+        .first()
+    )
+
+
+def _find_by_object_key(db: Session, owner_id, bucket: str, object_key: str) -> Media | None:
+    return (
+        db.query(Media)
+        .filter(
+            Media.owner_id == owner_id,
+            Media.bucket == bucket,
+            Media.object_key == object_key,
+        )
+        .first()
+    )
+
+
+@router.post("/upload", response_model=UploadResp)
 def upload_media(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    bucket = os.getenv("MINIO_BUCKET", "products")
-    minio = get_minio()
+    content_type = file.content_type or ""
+    ext = _MIME_TO_EXT.get(content_type)
+    if ext is None:
+        raise HTTPException(status_code=400, detail="unsupported content type")
+
+    # тело не читаем в bytes: SpooledTemporaryFile стримится в MinIO
+    # частями по UPLOAD_PART_SIZE — память на загрузку не растёт с файлом
+    size_bytes = _upload_size(file)
+    if not size_bytes:
+        raise HTTPException(status_code=400, detail="empty file")
 
-    if not minio.bucket_exists(bucket):
-        minio.make_bucket(bucket)
+    # sha256 — проходом по spooled-файлу: file_digest читает в свой буфер
+    # без GIL (OpenSSL, SHA-NI). Повторная загрузка того же файла тем же
+    # владельцем не делает ни PUT в MinIO, ни INSERT
+    checksum = hashlib.file_digest(file.file, "sha256").hexdigest()
+    file.file.seek(0)
 
-    content = file.file.read()
-    if not content:
-        raise HTTPException(status_code=400, detail="empty file")
+    existing = _find_by_checksum(db, current_user.id, checksum)
+    if existing:
+        return _upload_resp(existing)
+
+    bucket = os.getenv("MINIO_BUCKET", "products")
+    minio = get_minio()
+    _ensure_bucket(minio, bucket)
 
-    size_bytes = len(content)
-    ext = os.path.splitext(file.filename or "")[1]
-    object_key = f"{current_user.id}/{uuid.uuid4()}{ext}"
+    object_key = f"{current_user.id}/{uuid7_str()}.{ext}"
 
     minio.put_object(
         bucket_name=bucket,
         object_name=object_key,
-        data=io.BytesIO(content),
+        data=file.file,
         length=size_bytes,
-        content_type=file.content_type or "application/octet-stream",
+        content_type=content_type,
+        part_size=UPLOAD_PART_SIZE,
     )
 
+    # id / created_at генерирует Postgres (server_default)
     media = Media(
-        id=str(uuid.uuid4()),
         owner_id=current_user.id,
         bucket=bucket,
         object_key=object_key,
-        content_type=file.content_type or "application/octet-stream",
+        content_type=content_type,
         size_bytes=size_bytes,
-        checksum_sha256=None,
-        created_at=datetime.utcnow(),
+        checksum_sha256=checksum,
     )
 
     db.add(media)
-    db.commit()
-    db.refresh(media)
+    try:
+        db.commit()
+    except IntegrityError:
+        # параллельная загрузка того же файла успела раньше
+        # (ix_media_owner_checksum) — отдаём её, свой объект убираем
+        db.rollback()
+        try:
+            minio.remove_object(bucket, object_key)
+        except Exception:
+            pass  # best-effort
+        existing = _find_by_checksum(db, current_user.id, checksum)
+        if not existing:
+            raise
+        return _upload_resp(existing)
+
+    return _upload_resp(media)
+
+
+# -----------------------------------------------------------------------------
+# PRESIGNED UPLOAD (байты идут браузер → MinIO, мимо API)
+# -----------------------------------------------------------------------------
+
+PRESIGN_PUT_EXPIRES = int(os.getenv("MINIO_PRESIGN_PUT_EXPIRES", "600"))  # сек
+
+
+class PresignReq(BaseModel):
+    content_type: str
+
+
+class PresignResp(BaseModel):
+    upload_url: str
+    bucket: str
+    object_key: str
+    expires_in: int
+
+
+class CommitReq(BaseModel):
+    object_key: str
+
+
+@functools.lru_cache(maxsize=1)
+def _public_minio() -> Minio:
+    """
+    Клиент только для подписи URL под публичный endpoint: SigV4 подписывает
+    host, поэтому URL для браузера сразу подписывается публичным адресом.
+    region задан явно — подпись считается локально, без запроса к MinIO.
+    """
+    public_minio = os.getenv("MINIO_PUBLIC_ENDPOINT")
+    if not public_minio:
+        raise HTTPException(status_code=500, detail="MINIO_PUBLIC_ENDPOINT not set")
+
+    return Minio(
+        _strip_scheme(public_minio),
+        access_key=os.getenv("MINIO_ACCESS_KEY"),
+        secret_key=os.getenv("MINIO_SECRET_KEY"),
+        secure=public_minio.startswith("https://"),
+        region=os.getenv("MINIO_REGION", "us-east-1"),
+    )
+
+
+@router.post("/presign", response_model=PresignResp)
+def presign_upload(
+    payload: PresignReq,
+    current_user=Depends(get_current_user),
+):
+    """
+    Шаг 1: presigned PUT — клиент грузит файл прямо в MinIO,
+    затем подтверждает загрузку через POST /v1/media/commit.
+    """
+    ext = _MIME_TO_EXT.get(payload.content_type)
+    if ext is None:
+        raise HTTPException(status_code=400, detail="unsupported content type")
+
+    bucket = os.getenv("MINIO_BUCKET", "products")
+    _ensure_bucket(get_minio(), bucket)
+
+    object_key = f"{current_user.id}/{uuid7_str()}.{ext}"
+    upload_url = _public_minio().presigned_put_object(
+        bucket,
+        object_key,
+        expires=timedelta(seconds=PRESIGN_PUT_EXPIRES),
+    )
 
     return {
-        "media_id": media.id,
-        "bucket": media.bucket,
-        "object_key": media.object_key,
-        "size_bytes": media.size_bytes,
+        "upload_url": upload_url,
+        "bucket": bucket,
+        "object_key": object_key,
+        "expires_in": PRESIGN_PUT_EXPIRES,
     }
 
 
+@router.post("/commit", response_model=UploadResp)
+def commit_upload(
+    payload: CommitReq,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Шаг 2: объект уже в MinIO — проверяем его (stat_object) и создаём Media.
+    Повторный commit того же object_key возвращает ту же запись.
+    """
+    object_key = payload.object_key
+    # ключи выдаёт presign с префиксом владельца — чужой ключ как отсутствующий
+    if not object_key.startswith(f"{current_user.id}/"):
+        raise HTTPException(status_code=404, detail="object not found")
+
+    bucket = os.getenv("MINIO_BUCKET", "products")
+
+    existing = _find_by_object_key(db, current_user.id, bucket, object_key)
+    if existing:
+        return _upload_resp(existing)
+
+    minio = get_minio()
+    try:
+        stat = minio.stat_object(bucket, object_key)
+    except S3Error:
+        raise HTTPException(status_code=404, detail="object not found")
+
+    # presigned PUT не ограничивает тело, а Content-Type объекта задал
+    # клиент — тип определяем по сигнатуре первых байт; он же должен
+    # совпасть с расширением, которое presign выдал в object_key
+    content_type = None
+    if stat.size:
+        resp = minio.get_object(bucket, object_key, offset=0, length=_SNIFF_BYTES)
+        try:
+            content_type = _sniff_image_type(resp.read())
+        finally:
+            resp.close()
+            resp.release_conn()
+
+    if content_type is None or not object_key.endswith(f".{_MIME_TO_EXT[content_type]}"):
+        try:
+            minio.remove_object(bucket, object_key)
+        except Exception:
+            pass  # best-effort
+        raise HTTPException(status_code=400, detail="unsupported content type")
+
+    media = Media(
+        owner_id=current_user.id,
+        bucket=bucket,
+        object_key=object_key,
+        content_type=content_type,
+        size_bytes=stat.size,
+        checksum_sha256=None,
+    )
+    db.add(media)
+    try:
+        db.commit()
+    except IntegrityError:
+        # параллельный / повторный commit того же ключа успел раньше
+        # (ix_media_bucket_object_key) — отдаём его запись; объект общий, не удаляем
+        db.rollback()
+        existing = _find_by_object_key(db, current_user.id, bucket, object_key)
+        if not existing:
+            raise
+        return _upload_resp(existing)
+
+    return _upload_resp(media)
+
+
 # -----------------------------------------------------------------------------
 # GET media info
 # -----------------------------------------------------------------------------
@@ -109,13 +388,7 @@ def get_media(
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    media = db.query(Media).filter(Media.id == media_id).first()
-
-    if not media:
-        raise HTTPException(status_code=404, detail="media not found")
-
-    if media.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="access denied")
+    media = _get_owned_media(db, media_id, current_user.id)
 
     return {
         "id": media.id,
@@ -138,13 +411,7 @@ def head_media(
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    media = db.query(Media).filter(Media.id == media_id).first()
-
-    if not media:
-        raise HTTPException(status_code=404, detail="media not found")
-
-    if media.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="access denied")
+    media = _get_owned_media(db, media_id, current_user.id)
 
     response.headers["Content-Type"] = media.content_type
     response.headers["Content-Length"] = str(media.size_bytes)
@@ -164,13 +431,11 @@ def download_media(
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    media = db.query(Media).filter(Media.id == media_id).first()
-
-    if not media:
-        raise HTTPException(status_code=404, detail="media not found")
+    media = _get_owned_media(db, media_id, current_user.id)
 
-    if media.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="access denied")
+    hosts = _public_hosts()
+    if hosts is None:
+        raise HTTPException(status_code=500, detail="MINIO_PUBLIC_ENDPOINT not set")
 
     minio = get_minio()
 
@@ -183,19 +448,9 @@ def download_media(
     except Exception:
         raise HTTPException(status_code=500, detail="cannot generate download url")
 
-    public_minio = os.getenv("MINIO_PUBLIC_ENDPOINT")
-    if not public_minio:
-        raise HTTPException(status_code=500, detail="MINIO_PUBLIC_ENDPOINT not set")
-
-    internal = os.getenv("MINIO_ENDPOINT") \
-        .replace("http://", "") \
-        .replace("https://", "")
-
-    external = public_minio \
-        .replace("http://", "") \
-        .replace("https://", "")
-
-    download_url = raw_url.replace(internal, external)
+    # host стоит в URL один раз — одна замена по готовым строкам
+    internal, external = hosts
+    download_url = raw_url.replace(internal, external, 1)
 
     return {
         "media_id": media.id,
@@ -214,13 +469,7 @@ def delete_media(
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    media = db.query(Media).filter(Media.id == media_id).first()
-
-    if not media:
-        raise HTTPException(status_code=404, detail="media not found")
-
-    if media.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="access denied")
+    media = _get_owned_media(db, media_id, current_user.id)
 
     try:
         minio = get_minio()
@@ -0,0 +1,52 @@
+# migration_utils.py — хелперы для data-миграций Alembic
+import logging
+from typing import Any, Optional
+
+import sqlalchemy as sa
+from alembic import op
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def batched_execute(
+    sql: str,
+    params: Optional[dict[str, Any]] = None,
+    batch: int = 1000,
+) -> int:
+    """
+    Data-миграция порциями: каждая порция — отдельная (autocommit) транзакция.
+    Никаких долгих блокировок и загрузки всей таблицы за один commit.
+
+    sql ограничивает порцию через :batch и должен со временем
+    перестать находить строки (иначе цикл не закончится).
+    Пример (backfill / UUID cleanup в upgrade() ревизии — порциями,
+    а не одним UPDATE на всю таблицу):
+
+        from migration_utils import batched_execute
+
+        batched_execute(
+            '''
+            UPDATE products SET tags = '[]'
+            WHERE id_uuid IN (
+                SELECT id_uuid FROM products WHERE tags IS NULL LIMIT :batch
+            )
+            ''',
+            batch=1000,
+        )
+
+    Возвращает общее число затронутых строк.
+    """
+    stmt = sa.text(sql)
+    bind_params = {**(params or {}), "batch": batch}
+    total = 0
+
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        while True:
+            affected = conn.execute(stmt, bind_params).rowcount
+            if not affected:
+                break
+            total += affected
+            logger.info("batched_execute: +%s rows (total=%s)", affected, total)
+
+    return total
@@ -1,25 +1,68 @@
 from __future__ import annotations
 
 import enum
+import os
+import time
 import uuid
-from datetime import datetime
 
 from sqlalchemy import (
     Column,
+    Computed,
     String,
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     JSON,
     Boolean,
     BigInteger,
+    Integer,
     Table,
+    Text,
+    UniqueConstraint,
+    func,
+    literal_column,
+    select,
+    text,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
 
+# Серверные default'ы (id / created_at) генерирует Postgres в самом INSERT,
+# id возвращается через RETURNING. Время — naive UTC, как и везде в схеме.
+# uuid_generate_v7() — SQL-функция из миграции e7a2c4f9d1b5.
+_SQL_NEW_ID = text("uuid_generate_v7()::text")
+_SQL_NOW_UTC = text("timezone('utc', now())")
+
+
+# ============================================================
+# IDS (UUIDv7)
+# ============================================================
+
+def _uuid7_bytes() -> bytearray:
+    """
+    UUIDv7 (RFC 9562): 48 бит unix-времени в мс + случайные биты.
+    Ключи растут со временем — вставка идёт в правый край B-tree PK,
+    а не в случайную страницу, как у uuid4 (меньше page split и WAL).
+    """
+    b = bytearray(os.urandom(16))
+    b[:6] = (time.time_ns() // 1_000_000).to_bytes(6, "big")
+    b[6] = (b[6] & 0x0F) | 0x70  # version 7
+    b[8] = (b[8] & 0x3F) | 0x80  # variant RFC 4122
+    return b
+
+
+def uuid7() -> uuid.UUID:
+    return uuid.UUID(bytes=bytes(_uuid7_bytes()))
+
+
+def uuid7_str() -> str:
+    """Строковый UUIDv7 для String-id, без промежуточного объекта UUID."""
+    h = _uuid7_bytes().hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
 # ============================================================
 # ENUMS
 # ============================================================
@@ -67,15 +110,17 @@ product_media = Table(
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     email = Column(String, unique=True, nullable=False)
+    # lower(email), считает Postgres (uq_users_email_lc) — по ней login/register
+    email_lc = Column(String, Computed("lower(email)", persisted=True))
     password_hash = Column(String, nullable=False)
 
     is_active = Column(Boolean, default=True, nullable=False)
     deleted_at = Column(DateTime)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=_SQL_NOW_UTC)
+    updated_at = Column(DateTime, server_default=_SQL_NOW_UTC)
 
 
 # ============================================================
@@ -85,9 +130,15 @@ class User(Base):
 class Category(Base):
     __tablename__ = "categories"
 
-    id = Column(String, primary_key=True)
-    path = Column(String, nullable=False)
-    title = Column(String, nullable=False)
+    id = Column(String, primary_key=True, server_default=_SQL_NEW_ID)
+    # колонки — как в init_schema (e2a717f7292d)
+    parent_id = Column(String, ForeignKey("categories.id"), index=True)
+    name = Column(String, nullable=False)
+    slug = Column(String, nullable=False, index=True)
+    path = Column(String, nullable=False, index=True)
+    sort_order = Column(Integer)
+    is_active = Column(Boolean)
+    ai_aliases = Column(JSON)
 
 
 # ============================================================
@@ -98,7 +149,7 @@ class Product(Base):
     __tablename__ = "products"
 
     # 🔥 ЕДИНСТВЕННЫЙ PRIMARY KEY
-    id_uuid = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id_uuid = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
 
     # ⚠️ legacy id (НЕ PK, будет удалён в Phase 5)
     id = Column(String, nullable=False, unique=True, index=True)
@@ -130,14 +181,16 @@ class Product(Base):
     attributes = Column(JSON)
     tags = Column(JSON)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=_SQL_NOW_UTC)
+    updated_at = Column(DateTime, server_default=_SQL_NOW_UTC)
 
+    # загрузка только явно: .options(selectinload(Product.media))
     media = relationship(
         "Media",
         secondary=product_media,
         back_populates="products",
-        lazy="selectin",
+        lazy="raise",
+        passive_deletes=True,  # строки product_media чистит ON DELETE CASCADE
     )
 
 
@@ -148,7 +201,7 @@ class Product(Base):
 class Media(Base):
     __tablename__ = "media"
 
-    id = Column(String, primary_key=True)
+    id = Column(String, primary_key=True, server_default=_SQL_NEW_ID)
 
     owner_id = Column(
         UUID(as_uuid=True),
@@ -158,19 +211,23 @@ class Media(Base):
     )
 
     bucket = Column(String, nullable=False)
+    # (bucket, object_key) уникален (ix_media_bucket_object_key)
     object_key = Column(String, nullable=False)
     content_type = Column(String, nullable=False)
 
     size_bytes = Column(BigInteger)
+    # sha256 содержимого; (owner_id, checksum_sha256) уникален — дедуп загрузок
     checksum_sha256 = Column(String(64))
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=_SQL_NOW_UTC)
 
+    # загрузка только явно: .options(selectinload(Media.products))
     products = relationship(
         "Product",
         secondary=product_media,
         back_populates="media",
-        lazy="selectin",
+        lazy="raise",
+        passive_deletes=True,  # строки product_media чистит ON DELETE CASCADE
     )
 
 
@@ -181,7 +238,7 @@ class Media(Base):
 class AIJob(Base):
     __tablename__ = "ai_jobs"
 
-    id = Column(String, primary_key=True)
+    id = Column(String, primary_key=True, server_default=_SQL_NEW_ID)
 
     owner_id = Column(
         UUID(as_uuid=True),
@@ -212,6 +269,116 @@ class AIJob(Base):
     )
 
     hint = Column(JSON, default=dict)
+    result_json = Column(JSON)
+    error = Column(Text)
+
+    created_at = Column(DateTime, server_default=_SQL_NOW_UTC)
+    updated_at = Column(DateTime, server_default=_SQL_NOW_UTC)
+
+
+# ============================================================
+# LOOKS (ключи — uuid, миграции e5b8f2d4a1c6 / b8d1f3a7e2c4)
+# ============================================================
+
+class Look(Base):
+    __tablename__ = "looks"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+
+    owner_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id"),
+        nullable=False,
+        index=True,
+    )
+
+    title = Column(String)
+    occasion = Column(String)
+    season = Column(String)
+
+    # NOT NULL (a4c7e2f9b6d1): keyset list_looks идёт по (updated_at, id)
+    created_at = Column(DateTime, nullable=False, server_default=_SQL_NOW_UTC)
+    updated_at = Column(DateTime, nullable=False, server_default=_SQL_NOW_UTC)
+
+
+class LookItem(Base):
+    __tablename__ = "look_items"
+    # цель ON CONFLICT в add_look_item (миграция d2f6b9c3a8e1)
+    __table_args__ = (
+        UniqueConstraint("look_id", "product_id_uuid", name="uq_look_items_look_product_uuid"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+
+    look_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("looks.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+
+    product_id_uuid = Column(
+        UUID(as_uuid=True),
+        ForeignKey("products.id_uuid"),
+        nullable=False,
+        index=True,
+    )
+
+    created_at = Column(DateTime)
+
 
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+# ============================================================
+# STATE HISTORY (журнал событий / переходов, миграция e9c3a7f1b4d2)
+# ============================================================
+
+class StateHistory(Base):
+    __tablename__ = "state_history"
+    __table_args__ = (
+        Index("ix_state_history_entity", "entity_type", "entity_id", "created_at"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+
+    entity_type = Column(String, nullable=False)
+    # строкой: ai_jobs / media — text id, product — id_uuid
+    entity_id = Column(String, nullable=False)
+
+    from_state = Column(String)
+    to_state = Column(String)
+    event = Column(String, nullable=False)
+    actor = Column(String)
+
+    created_at = Column(DateTime, nullable=False, server_default=_SQL_NOW_UTC)
+
+
+# ============================================================
+# SHARED QUERIES
+# ============================================================
+
+def product_media_json(with_storage: bool = False):
+    """
+    media товара одним коррелированным json_agg (по Product.id_uuid внешнего
+    SELECT): [{id, content_type, url}], url собирает Postgres; без media — [].
+    with_storage — ещё bucket / object_key (документ Meili).
+    Единственное место формы media — API образов и индекс поиска не расходятся.
+    """
+    fields = [
+        "id", Media.id,
+        "content_type", Media.content_type,
+        "url", func.concat("/v1/media/", Media.id, "/download"),
+    ]
+    if with_storage:
+        fields += ["bucket", Media.bucket, "object_key", Media.object_key]
+
+    return (
+        select(
+            func.coalesce(
+                func.json_agg(func.json_build_object(*fields)),
+                literal_column("'[]'::json"),
+                type_=JSON,
+            )
+        )
+        .select_from(product_media.join(Media, Media.id == product_media.c.media_id))
+        .where(product_media.c.product_id_uuid == Product.id_uuid)
+        .scalar_subquery()
+    )
@@ -0,0 +1,20 @@
+# passwords.py — bcrypt для процесс-пула auth
+#
+# Отдельный модуль без импорта db/models: spawn-процесс пула импортирует
+# только его (функции передаются по ссылке на модуль) — без движков БД,
+# JWT_SECRET и остального API в каждом дочернем процессе.
+import os
+
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int((os.getenv("BCRYPT_ROUNDS") or "12").strip())
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def bcrypt_hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def bcrypt_verify(password: str, password_hash: str) -> bool:
+    return pwd_context.verify(password, password_hash)
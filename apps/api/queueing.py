@@ -1,5 +1,6 @@
 import os
 import logging
+import functools
 from typing import Optional
 from uuid import UUID
 
@@ -29,9 +30,11 @@ def _queue_name(default: str = "clothing") -> str:
     return name or default
 
 
+@functools.lru_cache(maxsize=1)
 def get_redis() -> Redis:
     """
-    Инициализация Redis connection.
+    Redis-клиент на процесс: один connection pool, TCP-соединения
+    переиспользуются, а не открываются на каждый enqueue.
     decode_responses=False — безопасно для RQ.
     """
     return Redis.from_url(_redis_url(), decode_responses=False)
@@ -1,8 +1,10 @@
+import functools
 import os
 from typing import Any, Optional
 from uuid import UUID
 
 from fastapi import APIRouter, Query, HTTPException, Depends
+from fastapi.responses import ORJSONResponse
 from meilisearch import Client as MeiliClient, errors as meili_errors
 
 from auth import get_current_user
@@ -10,21 +12,28 @@ from models import User
 
 router = APIRouter(prefix="/v1", tags=["catalog"])
 
+# Хиты Meili — уже чистый JSON (dict/list/str/число). Возвращаем
+# ORJSONResponse напрямую: обычный dict FastAPI сначала прогоняет через
+# jsonable_encoder (рекурсивный обход каждого хита на Python) и только
+# потом отдаёт orjson.
+
 
 # =============================================================================
 # MEILI CLIENT
 # =============================================================================
 
-def _meili() -> tuple[MeiliClient, str]:
+@functools.lru_cache(maxsize=1)
+def _meili_cached() -> Optional[tuple[MeiliClient, str]]:
+    """
+    env читаем и MeiliClient (с его keep-alive сессией) создаём один раз
+    на процесс, а не на каждый запрос. None — Meili не сконфигурирован.
+    """
     host = (os.getenv("MEILI_HOST") or "").strip()
     key = (os.getenv("MEILI_MASTER_KEY") or "").strip()
     index_name = (os.getenv("MEILI_INDEX") or "products").strip()
 
     if not host or not key:
-        raise HTTPException(
-            status_code=503,
-            detail="Search service is not configured",
-        )
+        return None
 
     if not host.startswith("http"):
         host = f"http://{host}"
@@ -32,6 +41,16 @@ def _meili() -> tuple[MeiliClient, str]:
     return MeiliClient(host, key), index_name
 
 
+def _meili() -> tuple[MeiliClient, str]:
+    cached = _meili_cached()
+    if cached is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Search service is not configured",
+        )
+    return cached
+
+
 # =============================================================================
 # FILTER BUILDER (UUID-FIRST)
 # =============================================================================
@@ -89,13 +108,13 @@ def search(
 
     hits = resp.get("hits") or []
 
-    return {
+    return ORJSONResponse({
         "items": hits,
         "limit": limit,
         "offset": offset,
         "total": resp.get("estimatedTotalHits"),
         "processing_time_ms": resp.get("processingTimeMs"),
-    }
+    })
 
 
 # =============================================================================
@@ -130,13 +149,13 @@ def list_catalog_products(
 
     hits = resp.get("hits") or []
 
-    return {
+    return ORJSONResponse({
         "items": hits,
         "limit": limit,
         "offset": offset,
         "total": resp.get("estimatedTotalHits"),
         "processing_time_ms": resp.get("processingTimeMs"),
-    }
+    })
 
 
 # =============================================================================
@@ -175,4 +194,4 @@ def get_catalog_product(
     if not hits:
         raise HTTPException(status_code=404, detail="product not found")
 
-    return hits[0]
\ No newline at end of file
+    return ORJSONResponse(hits[0])
\ No newline at end of file
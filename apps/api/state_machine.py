@@ -15,44 +15,22 @@ class InvalidStateTransition(Exception):
 # PRODUCT STATE MACHINE
 # ============================================================
 
+# Состояния — ProductState из models (колонка products.status).
+# Загрузка media и работа AI отслеживаются на media / ai_jobs, а не здесь:
+# у товара только черновик → готов → опубликован → архив.
 PRODUCT_STATE_TRANSITIONS: Dict[ProductState, Dict[str, ProductState]] = {
-    ProductState.DRAFT: {
-        "upload_media": ProductState.UPLOADING_MEDIA,
+    ProductState.DRAFT_EMPTY: {
+        "ai_completed": ProductState.DRAFT_READY,
     },
 
-    ProductState.UPLOADING_MEDIA: {
-        "media_uploaded": ProductState.MEDIA_READY,
-        "media_failed": ProductState.DRAFT,
+    ProductState.DRAFT_READY: {
+        "confirm_data": ProductState.READY,
+        "reset": ProductState.DRAFT_EMPTY,
     },
 
-    ProductState.MEDIA_READY: {
-        "start_ai": ProductState.AI_PENDING,
-        "reset": ProductState.DRAFT,
-    },
-
-    ProductState.AI_PENDING: {
-        "ai_started": ProductState.AI_PROCESSING,
-        "ai_failed": ProductState.AI_FAILED,
-    },
-
-    ProductState.AI_PROCESSING: {
-        "ai_completed": ProductState.AI_READY,
-        "ai_failed": ProductState.AI_FAILED,
-    },
-
-    ProductState.AI_FAILED: {
-        "retry_ai": ProductState.AI_PENDING,
-        "reset": ProductState.DRAFT,
-    },
-
-    ProductState.AI_READY: {
-        "confirm_data": ProductState.READY_FOR_PUBLISH,
-        "reset": ProductState.DRAFT,
-    },
-
-    ProductState.READY_FOR_PUBLISH: {
+    ProductState.READY: {
         "publish": ProductState.PUBLISHED,
-        "reset": ProductState.DRAFT,
+        "reset": ProductState.DRAFT_EMPTY,
     },
 
     ProductState.PUBLISHED: {
@@ -60,4 +38,4 @@ PRODUCT_STATE_TRANSITIONS: Dict[ProductState, Dict[str, ProductState]] = {
     },
 
     ProductState.ARCHIVED: {},
-}
\ No newline at end of file
+}
@@ -1,15 +1,18 @@
-import uuid
 from datetime import datetime
 from typing import Literal
 
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session
 
-from models import StateHistory
+from models import ProductState, StateHistory, uuid7
 from state_machine import PRODUCT_STATE_TRANSITIONS, InvalidStateTransition
 
 
 EntityType = Literal["product", "media", "ai_job"]
 
+# без общего at время ставит Postgres в самом INSERT (naive UTC, как колонка)
+_SQL_NOW_UTC = func.timezone("utc", func.now())
+
 
 class StateTransitionError(Exception):
     """
@@ -39,6 +42,76 @@ def _validate_transition(current_state, event: str, transitions: dict):
     return transitions[current_state][event]
 
 
+# ============================================================
+# СОБЫТИЕ БЕЗ FSM (MEDIA / AI_JOB)
+# ============================================================
+
+def record_event(
+    db: Session,
+    entity_type: EntityType,
+    entity_id,
+    event: str,
+    actor_id: str | None = None,
+    at: datetime | None = None,
+) -> None:
+    """
+    Фиксация события одним INSERT в state_history.
+    Сущность не нужна — достаточно её id (например, из UPDATE … RETURNING).
+    at — общий timestamp шага (иначе берётся текущее время).
+    """
+    db.execute(
+        insert(StateHistory).values(
+            id=uuid7(),
+            entity_type=entity_type,
+            entity_id=str(entity_id),
+            from_state=None,
+            to_state=None,
+            event=event,
+            actor=str(actor_id) if actor_id else None,
+            created_at=at or _SQL_NOW_UTC,
+        )
+    )
+
+
+# ============================================================
+# ПЕРЕХОД PRODUCT ПО ID (FSM БЕЗ ORM-ОБЪЕКТА)
+# ============================================================
+
+def record_transition(
+    db: Session,
+    entity_id,
+    current_state,
+    event: str,
+    actor_id: str | None = None,
+    at: datetime | None = None,
+):
+    """
+    Проверка перехода product по FSM и запись в state_history одним INSERT.
+    Сущность не нужна — достаточно id и текущего состояния
+    (например, только что вставленных Core INSERT'ом).
+    Возвращает новое состояние.
+    """
+    next_state = _validate_transition(
+        current_state=current_state,
+        event=event,
+        transitions=PRODUCT_STATE_TRANSITIONS,
+    )
+
+    db.execute(
+        insert(StateHistory).values(
+            id=uuid7(),
+            entity_type="product",
+            entity_id=str(entity_id),
+            from_state=current_state.value if current_state else None,
+            to_state=next_state.value,
+            event=event,
+            actor=str(actor_id) if actor_id else None,
+            created_at=at or _SQL_NOW_UTC,
+        )
+    )
+    return next_state
+
+
 # ============================================================
 # УНИВЕРСАЛЬНЫЙ CHANGE_STATE
 # ============================================================
@@ -49,6 +122,7 @@ def change_state(
     entity_type: EntityType,
     event: str,
     actor_id: str | None = None,
+    at: datetime | None = None,
 ):
     """
     Универсальный сервис фиксации состояния / событий.
@@ -61,46 +135,18 @@ def change_state(
     # PRODUCT — строгая FSM
     # --------------------------------------------------------
     if entity_type == "product":
-        current_state = entity.state
-
-        next_state = _validate_transition(
-            current_state=current_state,
-            event=event,
-            transitions=PRODUCT_STATE_TRANSITIONS,
-        )
-
-        entity.state = next_state
-
-        history = StateHistory(
-            id=uuid.uuid4(),
-            entity_type="product",
-            entity_id=entity.id,
-            from_state=current_state.value if current_state else None,
-            to_state=next_state.value,
-            event=event,
-            actor=str(actor_id) if actor_id else None,
-            created_at=datetime.utcnow(),
+        # PK товара — id_uuid (legacy id не используем); состояние — status
+        next_state = record_transition(
+            db, str(entity.id_uuid), ProductState(entity.status), event, actor_id, at
         )
-
-        db.add(history)
+        entity.status = next_state.value
         return next_state
 
     # --------------------------------------------------------
     # MEDIA / AI_JOB — ТОЛЬКО ФИКСАЦИЯ СОБЫТИЯ
     # --------------------------------------------------------
     if entity_type in ("media", "ai_job"):
-        history = StateHistory(
-            id=uuid.uuid4(),
-            entity_type=entity_type,
-            entity_id=entity.id,
-            from_state=None,
-            to_state=None,
-            event=event,
-            actor=str(actor_id) if actor_id else None,
-            created_at=datetime.utcnow(),
-        )
-
-        db.add(history)
+        record_event(db, entity_type, entity.id, event, actor_id, at)
         return None
 
     # --------------------------------------------------------
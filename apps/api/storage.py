@@ -1,6 +1,6 @@
 import os
 from io import BytesIO
-from typing import Optional
+from typing import BinaryIO, Optional, Union
 from minio import Minio
 
 
@@ -29,12 +29,18 @@ def ensure_bucket(bucket: Optional[str] = None) -> str:
 
 def put_object(
     *,
-    data: bytes,
+    data: Union[bytes, BinaryIO],
     content_type: str,
     object_key: Optional[str] = None,
     key: Optional[str] = None,
     bucket: Optional[str] = None,
+    length: int = -1,
+    part_size: int = 10 * 1024 * 1024,
 ) -> None:
+    """
+    data — bytes или file-like поток. Поток уходит в MinIO multipart-частями
+    по part_size без чтения целиком в память; length=-1 — размер неизвестен.
+    """
     obj_key = (object_key or key or "").strip()
     if not obj_key:
         raise ValueError("object_key/key is required")
@@ -42,5 +48,6 @@ def put_object(
     b = ensure_bucket(bucket)
 
     c = _client()
-    bio = BytesIO(data)
-    c.put_object(b, obj_key, bio, length=len(data), content_type=content_type)
+    if isinstance(data, bytes):
+        data, length = BytesIO(data), len(data)
+    c.put_object(b, obj_key, data, length=length, content_type=content_type, part_size=part_size)
@@ -1,15 +1,14 @@
-import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import func
 
-from db import get_db
+from db import db_scope
 from auth import get_current_user
-from models import User, WearLog, Product
+from models import User, WearLog, Product, uuid7_str
 
 router = APIRouter(prefix="/v1", tags=["wear_log"])
 
@@ -32,36 +31,39 @@ class WearLogCreate(BaseModel):
 @router.post("/wear-log", operation_id="create_wear_log")
 def create_wear_log(
     payload: WearLogCreate,
-    db: Session = Depends(get_db),
     current: User = Depends(get_current_user),
 ):
-    # 🔥 UUID-only: ищем продукт только по id_uuid
-    product = (
-        db.query(Product)
-        .filter(Product.id_uuid == payload.product_id_uuid)
-        .filter(Product.owner_id == current.id)
-        .first()
-    )
-
-    if not product:
-        raise HTTPException(status_code=404, detail="product not found")
-
-    wl = WearLog(
-        id=str(uuid.uuid4()),
-        owner_id=current.id,
-        product_id_uuid=product.id_uuid,
-        worn_at=payload.worn_at or datetime.utcnow(),
-        context=(payload.context or "").strip() or None,
-        notes=(payload.notes or "").strip() or None,
-        created_at=datetime.utcnow(),
-    )
-
-    db.add(wl)
-    db.commit()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)  # naive UTC, один на запрос
+    wl_id = uuid7_str()
+
+    with db_scope() as db:
+        # 🔥 UUID-only: ищем продукт только по id_uuid
+        product = (
+            db.query(Product)
+            .filter(Product.id_uuid == payload.product_id_uuid)
+            .filter(Product.owner_id == current.id)
+            .first()
+        )
+
+        if not product:
+            raise HTTPException(status_code=404, detail="product not found")
+
+        wl = WearLog(
+            id=wl_id,
+            owner_id=current.id,
+            product_id_uuid=product.id_uuid,
+            worn_at=payload.worn_at or now,
+            context=(payload.context or "").strip() or None,
+            notes=(payload.notes or "").strip() or None,
+            created_at=now,
+        )
+
+        db.add(wl)
+        db.commit()
 
     return {
-        "id": wl.id,
-        "product_id_uuid": str(wl.product_id_uuid),
+        "id": wl_id,
+        "product_id_uuid": str(payload.product_id_uuid),
     }
 
 
@@ -71,7 +73,6 @@ def create_wear_log(
 
 @router.get("/wear-log", operation_id="list_wear_log")
 def list_wear_log(
-    db: Session = Depends(get_db),
     current: User = Depends(get_current_user),
     product_id_uuid: Optional[UUID] = Query(None),
     date_from: Optional[datetime] = Query(None),
@@ -79,35 +80,53 @@ def list_wear_log(
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
 ):
-    q = db.query(WearLog).filter(WearLog.owner_id == current.id)
-
-    if product_id_uuid:
-        q = q.filter(WearLog.product_id_uuid == product_id_uuid)
-
-    if date_from:
-        q = q.filter(WearLog.worn_at >= date_from)
-
-    if date_to:
-        q = q.filter(WearLog.worn_at <= date_to)
-
-    total = q.count()
-
-    rows = (
-        q.order_by(WearLog.worn_at.desc())
-        .limit(limit)
-        .offset(offset)
-        .all()
-    )
+    # сессия — только на запросы; JSON собираем уже после возврата соединения
+    with db_scope() as db:
+        # total — оконным count() OVER () в той же выборке: фильтр выполняется
+        # один раз вместо отдельного COUNT(*) + страницы
+        q = db.query(
+            WearLog.id,
+            WearLog.product_id_uuid,
+            WearLog.worn_at,
+            WearLog.context,
+            WearLog.notes,
+            WearLog.created_at,
+            func.count().over().label("total"),
+        ).filter(WearLog.owner_id == current.id)
+
+        if product_id_uuid:
+            q = q.filter(WearLog.product_id_uuid == product_id_uuid)
+
+        if date_from:
+            q = q.filter(WearLog.worn_at >= date_from)
+
+        if date_to:
+            q = q.filter(WearLog.worn_at <= date_to)
+
+        rows = (
+            q.order_by(WearLog.worn_at.desc())
+            .limit(limit)
+            .offset(offset)
+            .all()
+        )
+
+        if rows:
+            total = rows[0].total
+        elif offset:
+            # offset за концом выборки: строк нет — и окна нет, считаем отдельно
+            total = q.with_entities(func.count(WearLog.id)).scalar()
+        else:
+            total = 0
 
     return {
         "items": [
             {
                 "id": r.id,
                 "product_id_uuid": str(r.product_id_uuid),
-                "worn_at": r.worn_at.isoformat(),
+                "worn_at": r.worn_at,
                 "context": r.context,
                 "notes": r.notes,
-                "created_at": r.created_at.isoformat(),
+                "created_at": r.created_at,
             }
             for r in rows
         ],
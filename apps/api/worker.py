@@ -1,8 +1,9 @@
 import os
 import logging
+import multiprocessing
 
 from redis import Redis
-from rq import Worker, Queue, Connection
+from rq import Worker, SimpleWorker, Queue, Connection
 
 import jobs
 
@@ -32,6 +33,43 @@ def _queues() -> list[str]:
     return [q or "clothing"]
 
 
+def _concurrency() -> int:
+    """
+    Сколько job'ов контейнер обрабатывает параллельно (RQ_CONCURRENCY).
+    Это же — потолок одновременных запросов к AI-сервису с одного контейнера.
+    """
+    raw = (os.getenv("RQ_CONCURRENCY") or "").strip()
+    return max(1, int(raw)) if raw else 1
+
+
+def _worker_class() -> type[Worker]:
+    """
+    RQ_WORKER_CLASS=simple — job'ы выполняются в самом процессе воркера (без fork),
+    поэтому пулы соединений из jobs.py (AI, Meili, БД) переиспользуются между job'ами.
+    По умолчанию — обычный Worker (fork на каждый job, изоляция падений).
+    """
+    raw = (os.getenv("RQ_WORKER_CLASS") or "").strip().lower()
+    return SimpleWorker if raw == "simple" else Worker
+
+
+def _work(redis_url: str, qnames: list[str]) -> None:
+    conn = Redis.from_url(redis_url)
+    queues = [Queue(name, connection=conn) for name in qnames]
+
+    worker_class = _worker_class()
+
+    # пакетная индексация Meili — только когда процесс живёт дольше одного job'а
+    if worker_class is SimpleWorker:
+        jobs.start_meili_batcher()
+
+    try:
+        with Connection(conn):
+            worker = worker_class(queues)
+            worker.work(with_scheduler=True)
+    finally:
+        jobs.stop_meili_batcher()  # дослать буфер при остановке
+
+
 # ============================================================
 # ENTRYPOINT
 # ============================================================
@@ -39,10 +77,13 @@ def _queues() -> list[str]:
 def main() -> None:
     redis_url = _redis_url()
     qnames = _queues()
+    concurrency = _concurrency()
 
     logger.info("[worker] starting")
     logger.info("[worker] redis=%s", redis_url)
     logger.info("[worker] queues=%s", qnames)
+    logger.info("[worker] concurrency=%s", concurrency)
+    logger.info("[worker] class=%s", _worker_class().__name__)
 
     # init Meili once on worker startup
     try:
@@ -52,12 +93,20 @@ def main() -> None:
     except Exception:
         logger.exception("[worker] meili init failed")
 
-    conn = Redis.from_url(redis_url)
-    queues = [Queue(name, connection=conn) for name in qnames]
-
-    with Connection(conn):
-        worker = Worker(queues)
-        worker.work(with_scheduler=True)
+    if concurrency == 1:
+        _work(redis_url, qnames)
+        return
+
+    # N независимых RQ-воркеров: пока один ждёт AI (5–120 с),
+    # остальные берут следующие job'ы из очереди
+    procs = [
+        multiprocessing.Process(target=_work, args=(redis_url, qnames), name=f"rq-worker-{i}")
+        for i in range(concurrency)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
 
 
 if __name__ == "__main__":
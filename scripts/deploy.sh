@@ -32,9 +32,9 @@ git pull --ff-only
 
 echo "[deploy] docker compose build..."
 if [[ "$NO_CACHE" == "1" ]]; then
-  docker compose build --no-cache api worker
+  docker compose build --no-cache migrate api worker
 else
-  docker compose build api worker
+  docker compose build migrate api worker
 fi
 
 echo "[deploy] docker compose up infra..."
@@ -57,7 +57,7 @@ done
 
 echo "[deploy] run migrations..."
 # migrations via one-off container (no dependency on api runtime state)
-docker compose run --rm api bash -lc "cd /app && alembic upgrade head"
+docker compose run --rm migrate
 
 echo "[deploy] docker compose up app..."
 # важно: worker поднимаем вместе с api, до smoke